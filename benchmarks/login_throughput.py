@@ -0,0 +1,118 @@
+"""
+Login throughput benchmark.
+
+Fires a burst of concurrent logins against a running API while probing /health,
+to measure both login throughput and how much the burst slows down other requests.
+
+Usage:
+    python benchmarks/login_throughput.py --url http://localhost:8000 \
+        --username admin --password password --logins 200 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def run_logins(
+    client: httpx.AsyncClient,
+    username: str,
+    password: str,
+    logins: int,
+    concurrency: int,
+) -> tuple[list[float], int]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def login():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            resp = await client.post(
+                "/login", json={"username": username, "password": password}
+            )
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code != 200:
+                errors += 1
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+    return latencies, errors
+
+
+async def probe_health(
+    client: httpx.AsyncClient, stop: asyncio.Event, interval: float
+) -> list[float]:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/health")
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+def report(name: str, latencies: list[float]):
+    if not latencies:
+        print(f"{name}: no samples")
+        return
+    print(
+        f"{name}: n={len(latencies)} "
+        f"mean={statistics.mean(latencies) * 1000:.1f}ms "
+        f"p50={percentile(latencies, 50) * 1000:.1f}ms "
+        f"p99={percentile(latencies, 99) * 1000:.1f}ms "
+        f"max={max(latencies) * 1000:.1f}ms"
+    )
+
+
+async def main(args: argparse.Namespace):
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=args.timeout
+    ) as client:
+        # baseline latency of a cheap endpoint without load
+        stop = asyncio.Event()
+        baseline_task = asyncio.create_task(probe_health(client, stop, 0.01))
+        await asyncio.sleep(1)
+        stop.set()
+        baseline = await baseline_task
+
+        stop = asyncio.Event()
+        health_task = asyncio.create_task(probe_health(client, stop, 0.01))
+        start = time.perf_counter()
+        login_latencies, errors = await run_logins(
+            client, args.username, args.password, args.logins, args.concurrency
+        )
+        elapsed = time.perf_counter() - start
+        stop.set()
+        under_load = await health_task
+
+    print(
+        f"logins: {args.logins} in {elapsed:.2f}s "
+        f"({args.logins / elapsed:.1f}/s), errors={errors}"
+    )
+    report("login latency", login_latencies)
+    report("/health baseline", baseline)
+    report("/health during logins", under_load)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=60)
+    asyncio.run(main(parser.parse_args()))
@@ -20,3 +20,26 @@ CREATE TABLE IF NOT EXISTS user_org (
     role TEXT NOT NULL,
     joined_at TIMESTAMPTZ DEFAULT NOW()
 );
+
+CREATE INDEX IF NOT EXISTS user_org_user_id_org_id_idx ON user_org (user_id, org_id);
+
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti UUID PRIMARY KEY,
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS vector_indexes (
+    org_id UUID PRIMARY KEY REFERENCES organizations(id) ON DELETE CASCADE,
+    rebuild_requested_at TIMESTAMPTZ,
+    build_started_at TIMESTAMPTZ,
+    built_at TIMESTAMPTZ,
+    error TEXT
+);
+
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    schema_name TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (schema_name, version)
+);
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import psycopg
+from loguru import logger
+from src.cache import MISSING, TTLCache
+
+# Channel notified by the user_org trigger whenever a membership changes
+USER_ORG_CHANNEL = "user_org_changed"
+
+
+class AccessCache:
+    """
+    Caches the role of users in organizations and the existence of projects,
+    so that access checks don't need a database round trip.
+    Memberships are invalidated through Postgres NOTIFY when they change.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.roles = TTLCache(max_size=max_size, ttl=ttl)
+        self.projects = TTLCache(max_size=max_size, ttl=ttl)
+        self._listener: asyncio.Task | None = None
+
+    def get_role(self, user_id: str, organization_id: str):
+        """Returns the cached role (None if not a member) or MISSING if not cached"""
+        return self.roles.get((str(user_id), str(organization_id)))
+
+    def set_role(self, user_id: str, organization_id: str, role: str | None):
+        self.roles.set((str(user_id), str(organization_id)), role)
+
+    def invalidate_role(self, user_id: str, organization_id: str):
+        self.roles.delete((str(user_id), str(organization_id)))
+
+    def project_exists(self, organization_id: str, project_id: str) -> bool:
+        """Only existing projects are cached, as missing ones might get created"""
+        return (
+            self.projects.get((str(organization_id), str(project_id)), MISSING)
+            is not MISSING
+        )
+
+    def set_project_exists(self, organization_id: str, project_id: str):
+        self.projects.set((str(organization_id), str(project_id)), True)
+
+    def start_listener(self, db_url: str):
+        """Start listening to membership changes in the background"""
+        if self.roles.enabled and self._listener is None:
+            self._listener = asyncio.create_task(self._listen(db_url))
+
+    async def stop_listener(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self, db_url: str):
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    db_url, autocommit=True
+                ) as conn:
+                    await conn.execute(f"LISTEN {USER_ORG_CHANNEL};")
+                    # Changes might have been missed while not listening
+                    self.roles.clear()
+                    logger.info("Listening to membership changes")
+                    async for notify in conn.notifies():
+                        try:
+                            payload = json.loads(notify.payload)
+                            self.invalidate_role(payload["user_id"], payload["org_id"])
+                        except Exception as e:
+                            logger.error(f"Invalid membership notification: {e}")
+                            self.roles.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Membership listener disconnected: {e}")
+                self.roles.clear()
+                await asyncio.sleep(5)
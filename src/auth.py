@@ -1,8 +1,11 @@
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 from src.configuration import config
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import bcrypt
 from dotenv import load_dotenv
 
@@ -10,6 +13,12 @@ load_dotenv()
 
 security = HTTPBearer()
 
+# bcrypt is CPU bound and releases the GIL, so it runs in a dedicated pool to keep
+# the event loop responsive. The pool size caps how many cores hashing can take.
+_bcrypt_executor = ThreadPoolExecutor(
+    max_workers=config.BCRYPT_MAX_CONCURRENCY, thread_name_prefix="bcrypt"
+)
+
 
 def hash_password(password: str) -> str:
     """
@@ -22,7 +31,7 @@ def hash_password(password: str) -> str:
         str: The hashed password.
     """
     # Generate a salt and hash the password
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password.encode(), salt)
     return hashed.decode()  # Store as string in database
 
@@ -41,6 +50,25 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
 
 
+async def ahash_password(password: str) -> str:
+    """
+    Hashes the given password in the bcrypt thread pool, without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_executor, hash_password, password)
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verifies a password against its hash in the bcrypt thread pool,
+    without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _bcrypt_executor, verify_password, plain_password, hashed_password
+    )
+
+
 def generate_jwt_token(user_id: str, expires_in: int = config.JWT_EXPIRES_IN) -> str:
     """
     Generates a JWT token for the given user ID and expiration time.
@@ -54,12 +82,61 @@ def generate_jwt_token(user_id: str, expires_in: int = config.JWT_EXPIRES_IN) ->
     """
     payload = {
         "user_id": user_id,
-        "exp": datetime.now() + timedelta(seconds=expires_in),
+        "exp": datetime.now(timezone.utc) + timedelta(seconds=expires_in),
     }
     token = jwt.encode(payload, config.JWT_SECRET_KEY, algorithm="HS256")
     return token
 
 
+def generate_access_token(
+    user_id: str,
+    org_roles: dict[str, str],
+    expires_in: int = config.JWT_ACCESS_EXPIRES_IN,
+) -> str:
+    """
+    Generates a short-lived access token embedding the roles of the user in their organizations,
+    so that access checks can be done without querying the database.
+
+    Args:
+        user_id (str): The user ID to include in the token.
+        org_roles (dict[str, str]): The role of the user in each of their organizations.
+        expires_in (int): The token lifetime in seconds.
+
+    Returns:
+        str: The generated JWT token.
+    """
+    payload = {
+        "user_id": user_id,
+        "orgs": {str(org_id): role for org_id, role in org_roles.items()},
+        "type": "access",
+        "exp": datetime.now(timezone.utc) + timedelta(seconds=expires_in),
+    }
+    return jwt.encode(payload, config.JWT_SECRET_KEY, algorithm="HS256")
+
+
+def generate_refresh_token(
+    user_id: str, expires_in: int = config.JWT_REFRESH_EXPIRES_IN
+) -> str:
+    """
+    Generates a long-lived refresh token, only accepted by /refresh and /logout.
+    Its `jti` identifies it in the revocation list.
+
+    Args:
+        user_id (str): The user ID to include in the token.
+        expires_in (int): The token lifetime in seconds.
+
+    Returns:
+        str: The generated JWT token.
+    """
+    payload = {
+        "user_id": user_id,
+        "jti": str(uuid.uuid4()),
+        "type": "refresh",
+        "exp": datetime.now(timezone.utc) + timedelta(seconds=expires_in),
+    }
+    return jwt.encode(payload, config.JWT_SECRET_KEY, algorithm="HS256")
+
+
 def decode_jwt_token(token: str) -> dict:
     """
     Decodes the given JWT token.
@@ -88,6 +165,8 @@ async def get_current_user(
     """
     token = credentials.credentials
     payload = decode_jwt_token(token)  # This will raise HTTPException if invalid
+    if payload.get("type") == "refresh":
+        raise HTTPException(status_code=401, detail="Invalid token")
     return payload
 
 
@@ -96,3 +175,13 @@ async def get_current_user_id(payload: dict = Depends(get_current_user)) -> str:
     Extract user_id from the validated token payload.
     """
     return payload.get("user_id")
+
+
+async def get_current_user_roles(
+    payload: dict = Depends(get_current_user),
+) -> dict[str, str] | None:
+    """
+    Extract the organization roles embedded in access tokens.
+    None for tokens without role claims, the roles are then read from the database.
+    """
+    return payload.get("orgs")
@@ -15,10 +15,25 @@ class Settings(BaseSettings):
     DB_POOL_MAX_SIZE: int = 10
     DB_POOL_IDLE_TIMEOUT: int = 300
     DB_POOL_LIFETIME_TIMEOUT: int = 1800
+    DB_POOL_ADAPTIVE: bool = False  # resize the pools based on checkout waits
+    DB_POOL_ADAPTIVE_MIN_SIZE: int = 1  # lower bound when DB_POOL_ADAPTIVE is enabled
+    DB_POOL_ADAPTIVE_INTERVAL: int = 30  # in seconds
+    DB_POOL_ADAPTIVE_WAIT_MS: int = 10  # average checkout wait above which it grows
+    DB_READ_URLS: str = ""  # comma-separated read replica URLs
+    DB_READ_YOUR_WRITES_WINDOW: int = 5  # in seconds, primary reads after a write
+    DB_PGBOUNCER: bool = False  # DB_URL points to PgBouncer in transaction mode
+    DB_DIRECT_URL: str = ""  # bypasses PgBouncer for session features, or DB_URL
 
     # Security Configuration
     JWT_EXPIRES_IN: int = "1296000"  # in seconds
     JWT_SECRET_KEY: str = "some_dummy_key"
+    JWT_ROLE_CLAIMS: bool = False  # access tokens embed the organization roles
+    JWT_ACCESS_EXPIRES_IN: int = 300  # in seconds, used with JWT_ROLE_CLAIMS
+    JWT_REFRESH_EXPIRES_IN: int = 1296000  # in seconds, used with JWT_ROLE_CLAIMS
+    ACCESS_CACHE_TTL: int = 30  # in seconds, 0 disables the membership cache
+    ACCESS_CACHE_MAX_SIZE: int = 10000
+    BCRYPT_ROUNDS: int = 12  # work factor of new password hashes
+    BCRYPT_MAX_CONCURRENCY: int = 2  # threads hashing passwords at the same time
 
     # Admin User Configuration
     CREATE_DEFAULT_ADMIN_USER: bool = True
@@ -34,6 +49,30 @@ class Settings(BaseSettings):
     OPENAI_MODEL: str = "gpt-5"  # used for both OpenAI and vLLM
     OPENAI_HOST: str = "https://api.openai.com/v1"  # used for both OpenAI and vLLM
     USE_VLLM: bool = False
+    OPENAI_TIMEOUT: float = 60  # in seconds, per request
+    OPENAI_CONNECT_TIMEOUT: float = 5  # in seconds
+    OPENAI_MAX_RETRIES: int = 2  # on connection errors, 429 and 5xx
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_KEEPALIVE_EXPIRY: float = 30  # in seconds
+    EMBEDDING_CACHE_MAX_BYTES: int = 33554432  # query embeddings kept in process
+    EMBEDDING_CACHE_REDIS: bool = False  # share them through the arq Redis
+    EMBEDDING_CACHE_REDIS_TTL: int = 86400  # in seconds
+    SEARCH_CACHE_TTL: int = 300  # in seconds, 0 disables the search result cache
+    SEARCH_CACHE_MAX_SIZE: int = 1000
+    VECTOR_INDEX_THRESHOLD: int = 10000  # chunks above which an org is indexed
+    VECTOR_INDEX_M: int = 16  # HNSW build parameter
+    VECTOR_INDEX_EF_CONSTRUCTION: int = 64  # HNSW build parameter
+    VECTOR_INDEX_EF_SEARCH: int = 40  # default, can be set per search request
+    VECTOR_INDEX_MAINTENANCE_WORK_MEM: str = "512MB"  # memory of an index build
+    VECTOR_SEARCH_EXACT_THRESHOLD: int = 10000  # smaller projects are scanned exactly
+    VECTOR_SEARCH_MAX_SCAN_TUPLES: int = 20000  # bound of iterative index scans
+    VECTOR_SEARCH_PROJECT_SIZE_TTL: int = 60  # in seconds
+    SEARCH_HYBRID_CANDIDATES: int = 50  # results of each ranking fused in hybrid mode
+    SEARCH_HYBRID_VECTOR_WEIGHT: float = 1.0
+    SEARCH_HYBRID_TEXT_WEIGHT: float = 1.0
+    SEARCH_RRF_K: int = 60  # rank constant of the reciprocal rank fusion
+    SEARCH_BATCH_CONCURRENCY: int = 4  # queries of a batch searched at the same time
 
     # Parser Configuration
     USE_LLAMA_PARSE: bool = True
@@ -57,6 +96,15 @@ class Settings(BaseSettings):
             database=self.REDIS_ARQ_DATABASE,
         )
 
+    @property
+    def DB_READ_URLS_LIST(self) -> list[str]:
+        return [url.strip() for url in self.DB_READ_URLS.split(",") if url.strip()]
+
+    @property
+    def DB_SESSION_URL(self) -> str:
+        """URL for the features needing a dedicated session: migrations, LISTEN, pgai"""
+        return self.DB_DIRECT_URL or self.DB_URL
+
     @property
     def OPENAI_BASE_URL(self) -> str:
         if self.USE_VLLM and self.OPENAI_HOST:
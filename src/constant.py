@@ -1,4 +1,12 @@
+# Text search configuration of the chunks full-text index. `simple` doesn't stem nor drop
+# words, so that identifiers such as part numbers or error codes match exactly
+TEXT_SEARCH_CONFIG = "simple"
+
+
 class TableNames:
     reserved_project_table_name = "project"
     reserved_document_table_name = "document"
     reserved_pgai_table_name = "pgai"
+    reserved_document_page_table_name = "document_page"
+    reserved_document_stats_table_name = "document_stats"
+    reserved_project_data_version_table_name = "project_data_version"
@@ -1,11 +1,20 @@
 import pgai
 import sys
+import time
 import asyncio
-from psycopg_pool import AsyncConnectionPool
-from pgvector.psycopg import register_vector_async
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from pgvector.psycopg.bit import register_bit_info
+from pgvector.psycopg.halfvec import register_halfvec_info
+from pgvector.psycopg.sparsevec import register_sparsevec_info
+from pgvector.psycopg.vector import register_vector_info
 import psycopg
+from psycopg import sql
+from psycopg.types import TypeInfo
 from contextlib import asynccontextmanager
-from src.configuration import config
+from loguru import logger
+from src.cache import TTLCache
+from src.configuration import Settings, config
+from src.pool_metrics import PoolMetrics, TimedAsyncCursor
 
 # Set Windows-compatible event loop policy
 if sys.platform == "win32":
@@ -15,37 +24,237 @@ if sys.platform == "win32":
 class Database:
     def __init__(self):
         self.pool: AsyncConnectionPool | None = None
+        self.read_pools: list[AsyncConnectionPool] = []  # replicas, if configured
+        self.settings: Settings = config
+        # Organizations recently written to by this process, read from the primary
+        self.recent_writes = TTLCache(
+            max_size=10000, ttl=config.DB_READ_YOUR_WRITES_WINDOW
+        )
+        self._next_read_pool = 0
+        # Connections currently checked out of a replica pool
+        self._replica_connections: set[psycopg.AsyncConnection] = set()
+        self.metrics: dict[str, PoolMetrics] = {}  # by pool name
+        self._tuner: asyncio.Task | None = None
+        self._vector_types: dict[str, TypeInfo | None] | None = None
 
     async def setup_pgvector_psycopg(self, conn: psycopg.AsyncConnection):
-        await register_vector_async(conn)
+        """
+        Registers the pgvector types on a new connection.
+        Their OIDs are looked up once, the following connections are set up without a query.
+        """
+        types = self._vector_types
+        if types is None:
+            types = {
+                name: await TypeInfo.fetch(conn, name)
+                for name in ("vector", "bit", "halfvec", "sparsevec")
+            }
+            # Not cached until the extension is installed
+            if types["vector"] is not None:
+                self._vector_types = types
+        register_vector_info(conn, types["vector"])
+        register_bit_info(conn, types["bit"])
+        if types["halfvec"] is not None:
+            register_halfvec_info(conn, types["halfvec"])
+        if types["sparsevec"] is not None:
+            register_sparsevec_info(conn, types["sparsevec"])
 
-    async def connect(self):
-        """Initialize the connection pool"""
+    def create_pool(
+        self, name: str, db_url: str, settings: Settings
+    ) -> AsyncConnectionPool:
+        self.metrics[name] = PoolMetrics(name)
+        kwargs = {"cursor_factory": TimedAsyncCursor}
+        if settings.DB_PGBOUNCER:
+            # Prepared statements live in a server session, which PgBouncer doesn't pin
+            kwargs["prepare_threshold"] = None
+        return AsyncConnectionPool(
+            db_url,
+            name=name,
+            kwargs=kwargs,
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=settings.DB_POOL_MAX_SIZE,
+            open=False,
+            max_idle=settings.DB_POOL_IDLE_TIMEOUT,
+            max_lifetime=settings.DB_POOL_LIFETIME_TIMEOUT,
+            configure=self.setup_pgvector_psycopg,
+        )
+
+    @property
+    def pools(self) -> list[AsyncConnectionPool]:
+        return [self.pool, *self.read_pools] if self.pool is not None else []
+
+    async def connect(self, settings: Settings = config):
+        """Initialize the connection pools and wait for their minimum connections to be ready"""
         if self.pool is None:
-            self.pool = AsyncConnectionPool(
-                config.DB_URL,
-                min_size=config.DB_POOL_MIN_SIZE,
-                max_size=config.DB_POOL_MAX_SIZE,
-                open=False,
-                max_idle=config.DB_POOL_IDLE_TIMEOUT,
-                max_lifetime=config.DB_POOL_LIFETIME_TIMEOUT,
-                configure=self.setup_pgvector_psycopg,
+            self.settings = settings
+            self.recent_writes = TTLCache(
+                max_size=10000, ttl=settings.DB_READ_YOUR_WRITES_WINDOW
             )
-            await self.pool.open()
-            pgai.install(config.DB_URL)
+            self.pool = self.create_pool("primary", settings.DB_URL, settings)
+            self.read_pools = [
+                self.create_pool(f"replica_{i}", db_url, settings)
+                for i, db_url in enumerate(settings.DB_READ_URLS_LIST)
+            ]
+            await asyncio.gather(*(pool.open(wait=True) for pool in self.pools))
+            if self.read_pools:
+                logger.info(f"Reading from {len(self.read_pools)} replicas")
+            if settings.DB_PGBOUNCER:
+                logger.info("PgBouncer mode, prepared statements are disabled")
+            if settings.DB_POOL_ADAPTIVE:
+                self._tuner = asyncio.create_task(self._tune_pools())
+
+    async def ensure_pgai_installed(self):
+        """
+        Install pgai only if not already present.
+        Meant to run once at startup, the installer is synchronous so it runs in a thread.
+        """
+        async with self.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT schema_name FROM information_schema.schemata WHERE schema_name = 'ai';"
+                )
+                if await cur.fetchone():
+                    logger.info("pgai already installed, skipping")
+                    return
+        logger.info("Installing pgai...")
+        # install the necessary catalog tables and functions into the ai schema of the database.
+        await asyncio.to_thread(pgai.install, self.settings.DB_SESSION_URL)
 
     async def disconnect(self):
-        """Close the connection pool"""
+        """Close the connection pools"""
+        if self._tuner is not None:
+            self._tuner.cancel()
+            try:
+                await self._tuner
+            except asyncio.CancelledError:
+                pass
+            self._tuner = None
         if self.pool is not None:
-            await self.pool.close()
+            await asyncio.gather(*(pool.close() for pool in self.pools))
             self.pool = None
+            self.read_pools = []
+            self._vector_types = None
+
+    async def _tune_pools(self):
+        """
+        Adaptive pool sizing: the number of connections kept open (min_size) follows the load,
+        between DB_POOL_ADAPTIVE_MIN_SIZE and DB_POOL_MAX_SIZE.
+        It grows when checkouts wait and shrinks one step at a time when connections are unused,
+        idle connections above it are then closed after DB_POOL_IDLE_TIMEOUT.
+        """
+        settings = self.settings
+        floor = min(settings.DB_POOL_ADAPTIVE_MIN_SIZE, settings.DB_POOL_MAX_SIZE)
+        while True:
+            await asyncio.sleep(settings.DB_POOL_ADAPTIVE_INTERVAL)
+            for pool in self.pools:
+                try:
+                    average_wait, timeouts, peak_in_use = self.metrics[
+                        pool.name
+                    ].pop_window()
+                    if (
+                        timeouts
+                        or average_wait * 1000 > settings.DB_POOL_ADAPTIVE_WAIT_MS
+                    ):
+                        # Growing opens min_size - pool.min_size new connections,
+                        # which must fit next to the connections already open
+                        headroom = pool.max_size - pool.get_stats().get("pool_size", 0)
+                        min_size = min(
+                            pool.max_size,
+                            max(pool.min_size + 1, peak_in_use + 1),
+                            pool.min_size + max(0, headroom),
+                        )
+                        if headroom <= 0:
+                            logger.warning(
+                                f"Pool {pool.name} is exhausted (average wait {average_wait * 1000:.1f}ms, "
+                                f"{timeouts} timeouts), DB_POOL_MAX_SIZE might be too low"
+                            )
+                    elif peak_in_use < pool.min_size:
+                        min_size = max(floor, peak_in_use, pool.min_size - 1)
+                    else:
+                        min_size = pool.min_size
+                    if min_size != pool.min_size:
+                        logger.info(
+                            f"Resizing pool {pool.name} to {min_size} connections "
+                            f"(average wait {average_wait * 1000:.1f}ms, peak usage {peak_in_use})"
+                        )
+                        await pool.resize(min_size=min_size, max_size=pool.max_size)
+                except Exception as e:
+                    logger.error(f"Error resizing pool {pool.name}: {e}")
+
+    def mark_write(self, organization_id: str):
+        """Keep reading the organization from the primary until replicas have caught up with the write"""
+        self.recent_writes.set(str(organization_id), True)
+
+    def read_pool(self, organization_id: str | None = None) -> AsyncConnectionPool:
+        """
+        Pool to run read-only queries on: the replicas in turn, or the primary
+        if there is no replica or the organization was written to recently.
+        """
+        if not self.read_pools or (
+            organization_id is not None
+            and self.recent_writes.get(str(organization_id), False)
+        ):
+            return self.pool
+        pool = self.read_pools[self._next_read_pool % len(self.read_pools)]
+        self._next_read_pool += 1
+        return pool
 
     @asynccontextmanager
-    async def connection(self):
-        """Get a connection from the pool"""
+    async def connection(
+        self,
+        conn: psycopg.AsyncConnection | None = None,
+        read_only: bool = False,
+        organization_id: str | None = None,
+    ):
+        """
+        Get a connection from the pool, or reuse the given one (e.g. the request's connection).
+        Read-only connections come from a replica when possible.
+        """
+        if conn is not None:
+            yield conn
+            return
         if self.pool is None:
             raise RuntimeError("Database not connected")
-        async with self.pool.connection() as conn:
+        pool = self.read_pool(organization_id) if read_only else self.pool
+        metrics = self.metrics[pool.name]
+        start = time.monotonic()
+        checked_out = False
+        try:
+            async with pool.connection() as conn:
+                metrics.checked_out(time.monotonic() - start)
+                checked_out = True
+                if pool is not self.pool:
+                    self._replica_connections.add(conn)
+                try:
+                    yield conn
+                finally:
+                    self._replica_connections.discard(conn)
+        except PoolTimeout:
+            if not checked_out:
+                metrics.timed_out()
+            raise
+        finally:
+            if checked_out:
+                metrics.checked_in()
+
+    def is_replica(self, conn: psycopg.AsyncConnection | None) -> bool:
+        """Whether the connection was checked out of a replica pool, which might lag behind"""
+        return conn is not None and conn in self._replica_connections
+
+    @asynccontextmanager
+    async def tenant_connection(
+        self,
+        organization_id: str,
+        conn: psycopg.AsyncConnection | None = None,
+        read_only: bool = False,
+    ):
+        """
+        Same as `connection`, with unqualified table names resolved to the organization schema.
+        The statement text is then the same for every organization, so prepared statements are shared.
+        """
+        async with self.connection(
+            conn, read_only=read_only, organization_id=organization_id
+        ) as conn:
+            await set_tenant(conn, organization_id)
             yield conn
 
     @asynccontextmanager
@@ -56,5 +265,19 @@ class Database:
                 yield cur
 
 
+async def set_tenant(conn: psycopg.AsyncConnection, organization_id: str):
+    """
+    Points the search_path at the organization schema (then public) until the end of the transaction,
+    so that nothing leaks to the next user of the pooled connection.
+    """
+    search_path = sql.SQL(", ").join(
+        [sql.Identifier(str(organization_id)), sql.Identifier("public")]
+    )
+    await conn.execute(
+        "SELECT set_config('search_path', %s, true);",
+        (search_path.as_string(conn),),
+    )
+
+
 # Singleton instance
 db = Database()
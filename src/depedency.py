@@ -19,3 +19,27 @@ async def get_pgai_client(request: Request):
 
 async def get_parser_client(request: Request):
     return request.app.parser_client
+
+
+async def get_db_connection(request: Request):
+    """
+    Connection shared by the access check and the queries of a request.
+    Committed and returned to the pool when the request ends.
+    """
+    async with request.app.db.connection() as conn:
+        yield conn
+
+
+async def get_db_read_connection(request: Request, organization_id: str | None = None):
+    """
+    Same as `get_db_connection` for read-only endpoints, the connection comes from a replica
+    unless the organization was written to recently.
+    """
+    async with request.app.db.connection(
+        read_only=True, organization_id=organization_id
+    ) as conn:
+        yield conn
+
+
+async def get_database(request: Request):
+    return request.app.db
@@ -0,0 +1,101 @@
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from loguru import logger
+from redis.asyncio import Redis
+from src.configuration import Settings
+
+# Prefix of the embeddings stored in Redis, next to the arq keys
+REDIS_KEY_PREFIX = "llama-pg:embedding:"
+
+
+class EmbeddingCache:
+    """
+    Caches the embeddings of search queries, so that repeated queries skip the embedding API.
+    A process-local LRU bounded in bytes, optionally backed by Redis to share the
+    embeddings between processes.
+    Not thread-safe, meant to be used from the event loop.
+    """
+
+    def __init__(self, max_bytes: int, redis: Redis | None = None, redis_ttl: int = 0):
+        self.max_bytes = max_bytes
+        self.redis = redis
+        self.redis_ttl = redis_ttl
+        self.size = 0
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    @staticmethod
+    def key(model: str, dimensions: int, query: str) -> str:
+        """Queries differing only in case or whitespace share an embedding"""
+        normalized = " ".join(query.split()).casefold()
+        return hashlib.sha256(
+            f"{model}\0{dimensions}\0{normalized}".encode()
+        ).hexdigest()
+
+    async def get(self, key: str) -> np.ndarray | None:
+        embedding = self._entries.get(key)
+        if embedding is not None:
+            self._entries.move_to_end(key)
+            return embedding
+        if self.redis is None:
+            return None
+        try:
+            value = await self.redis.get(REDIS_KEY_PREFIX + key)
+        except Exception as e:
+            logger.warning(f"Embedding cache unavailable: {e}")
+            return None
+        if value is None:
+            return None
+        embedding = np.frombuffer(value, dtype=np.float32)
+        self._store(key, embedding)
+        return embedding
+
+    async def set(self, key: str, embedding: np.ndarray):
+        # pgvector stores single precision floats, so does the cache
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self._store(key, embedding)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(
+                REDIS_KEY_PREFIX + key, embedding.tobytes(), ex=self.redis_ttl or None
+            )
+        except Exception as e:
+            logger.warning(f"Embedding cache unavailable: {e}")
+
+    def _store(self, key: str, embedding: np.ndarray):
+        if embedding.nbytes > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= previous.nbytes
+        self._entries[key] = embedding
+        self.size += embedding.nbytes
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.nbytes
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def create_embedding_cache(settings: Settings) -> EmbeddingCache:
+    redis = None
+    if settings.EMBEDDING_CACHE_REDIS:
+        # Short timeouts, a missing Redis must not slow the searches down much
+        redis = Redis(
+            host=settings.REDIS_ARQ_HOST,
+            port=settings.REDIS_ARQ_PORT,
+            db=settings.REDIS_ARQ_DATABASE,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5,
+        )
+    return EmbeddingCache(
+        max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES,
+        redis=redis,
+        redis_ttl=settings.EMBEDDING_CACHE_REDIS_TTL,
+    )
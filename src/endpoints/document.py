@@ -1,14 +1,21 @@
+import uuid
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
 from fastapi.responses import JSONResponse
 from loguru import logger
-from src.auth import get_current_user_id
-from src.depedency import get_worker_client
-from src.models.document import DocumentDetail, DocumentParamsRequest
+from psycopg import AsyncConnection
+from src.auth import get_current_user_id, get_current_user_roles
+from src.depedency import get_db_connection, get_db_read_connection, get_worker_client
+from src.models.document import (
+    DocumentDetail,
+    DocumentPagesResponse,
+    DocumentParamsRequest,
+)
 from src.models.pagination import (
     PaginationParams,
     PaginationResponse,
     ParamRequest,
+    get_fields_params,
     get_pagination_params,
 )
 from src.worker_client import WorkerClient
@@ -16,6 +23,8 @@ import json
 
 router = APIRouter()
 
+MAX_PAGES_PER_REQUEST = 50
+
 
 @router.post("/upload_document")
 async def upload_document(
@@ -26,6 +35,7 @@ async def upload_document(
     document_name: Annotated[str | None, Form(description="Document title")] = None,
     metadata: Annotated[str | None, Form(description="Additional metadata")] = None,
     worker_client: WorkerClient = Depends(get_worker_client),
+    conn: AsyncConnection = Depends(get_db_connection),
 ):
     try:
         # Validate if the user has access to the organization and project
@@ -34,6 +44,7 @@ async def upload_document(
             project_id=project_id,
             user_id=user_id,
             roles_allowed=["member", "admin", "owner"],
+            conn=conn,
         )
         if not project_exists:
             return JSONResponse(
@@ -59,6 +70,7 @@ async def upload_document(
             project_id=project_id,
             user_id=user_id,
             insert_object=insert_object,
+            conn=conn,
         )
         return JSONResponse(
             status_code=200,
@@ -80,6 +92,7 @@ async def delete_document(
     user_id: str = Depends(get_current_user_id),
     params: DocumentParamsRequest = Depends(),
     worker_client: WorkerClient = Depends(get_worker_client),
+    conn: AsyncConnection = Depends(get_db_connection),
 ):
     try:
         document_id = str(params.document_id)
@@ -91,6 +104,7 @@ async def delete_document(
             project_id=project_id,
             user_id=user_id,
             roles_allowed=["admin", "owner"],
+            conn=conn,
         )
         if not project_exists:
             return JSONResponse(
@@ -103,6 +117,7 @@ async def delete_document(
             organization_id=organization_id,
             user_id=user_id,
             document_id=document_id,
+            conn=conn,
         )
         if is_success:
             return JSONResponse(
@@ -119,12 +134,19 @@ async def delete_document(
         )
 
 
-@router.get("/recent_documents_info", response_model=PaginationResponse)
+@router.get(
+    "/recent_documents_info",
+    response_model=PaginationResponse,
+    response_model_exclude_unset=True,
+)
 async def get_recent_documents_info(
     user_id: str = Depends(get_current_user_id),
+    token_roles: dict[str, str] | None = Depends(get_current_user_roles),
     pagination: PaginationParams = Depends(get_pagination_params),
     params: ParamRequest = Depends(),
+    fields: list[str] | None = Depends(get_fields_params),
     worker_client: WorkerClient = Depends(get_worker_client),
+    conn: AsyncConnection = Depends(get_db_read_connection),
 ):
     """
     Endpoint to retrieve information about the most recent documents for a project (or all).
@@ -138,6 +160,8 @@ async def get_recent_documents_info(
                 project_id=project_id,
                 user_id=user_id,
                 roles_allowed=["member", "admin", "owner"],
+                token_roles=token_roles,
+                conn=conn,
             )
             if not project_exists:
                 return JSONResponse(
@@ -152,6 +176,8 @@ async def get_recent_documents_info(
                 organization_id=organization_id,
                 user_id=user_id,
                 roles_allowed=["member", "admin", "owner"],
+                token_roles=token_roles,
+                conn=conn,
             )
             if not user_has_access:
                 return JSONResponse(
@@ -161,14 +187,21 @@ async def get_recent_documents_info(
                     },
                 )
             all_projects = await worker_client.get_all_projects(
-                organization_id=organization_id
+                organization_id=organization_id, conn=conn
             )  # No pagination for projects, either one or all. PaginationParams are for the documents below.
             projects = all_projects
 
         skip = pagination.skip
         limit = pagination.limit
         resp = await worker_client.get_recent_documents_info(
-            organization_id=organization_id, projects=projects, skip=skip, limit=limit
+            organization_id=organization_id,
+            projects=projects,
+            skip=skip,
+            limit=limit,
+            fields=fields,
+            cursor=pagination.cursor,
+            count=pagination.count,
+            conn=conn,
         )
         return resp
     except HTTPException:
@@ -181,32 +214,32 @@ async def get_recent_documents_info(
         )
 
 
-@router.get("/document", response_model=DocumentDetail)
+@router.get(
+    "/document", response_model=DocumentDetail, response_model_exclude_unset=True
+)
 async def get_document(
     user_id: str = Depends(get_current_user_id),
+    token_roles: dict[str, str] | None = Depends(get_current_user_roles),
     params: DocumentParamsRequest = Depends(),
+    fields: list[str] | None = Depends(get_fields_params),
     worker_client: WorkerClient = Depends(get_worker_client),
+    conn: AsyncConnection = Depends(get_db_read_connection),
 ):
     """Endpoint to retrieve a specific document by ID for a project"""
     try:
         project_id = params.project_id
         organization_id = params.organization_id
         document_id = params.document_id
-        project_exists = await worker_client.check_user_access_to_project(
+        # The access check is done by the same query, a 404 is raised without access
+        resp = await worker_client.get_document_by_id(
             organization_id=organization_id,
+            document_id=document_id,
+            fields=fields,
             project_id=project_id,
             user_id=user_id,
             roles_allowed=["member", "admin", "owner"],
-        )
-        if not project_exists:
-            return JSONResponse(
-                status_code=404,
-                content={
-                    "message": "Project does not exist or user does not have access."
-                },
-            )
-        resp = await worker_client.get_document_by_id(
-            organization_id=organization_id, document_id=document_id
+            token_roles=token_roles,
+            conn=conn,
         )
         return resp
     except HTTPException:
@@ -217,3 +250,54 @@ async def get_document(
             status_code=500,
             detail="Error retrieving a specific document",
         )
+
+
+@router.get("/document/{document_id}/pages", response_model=DocumentPagesResponse)
+async def get_document_pages(
+    document_id: uuid.UUID,
+    organization_id: str,
+    project_id: str,
+    from_page: int = Query(1, ge=1, alias="from", description="First page (1-based)"),
+    to_page: int | None = Query(
+        None, ge=1, alias="to", description="Last page, inclusive"
+    ),
+    user_id: str = Depends(get_current_user_id),
+    token_roles: dict[str, str] | None = Depends(get_current_user_roles),
+    worker_client: WorkerClient = Depends(get_worker_client),
+    conn: AsyncConnection = Depends(get_db_read_connection),
+):
+    """Endpoint to retrieve a range of pages of a document's parsed text"""
+    try:
+        if to_page is None:
+            to_page = from_page + MAX_PAGES_PER_REQUEST - 1
+        if to_page < from_page:
+            raise HTTPException(
+                status_code=400,
+                detail="'to' must be greater than or equal to 'from'",
+            )
+        if to_page - from_page + 1 > MAX_PAGES_PER_REQUEST:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {MAX_PAGES_PER_REQUEST} pages can be requested at once",
+            )
+        # The access check is done by the same query, a 404 is raised without access
+        resp = await worker_client.get_document_pages(
+            organization_id=organization_id,
+            project_id=project_id,
+            document_id=str(document_id),
+            from_page=from_page,
+            to_page=to_page,
+            user_id=user_id,
+            roles_allowed=["member", "admin", "owner"],
+            token_roles=token_roles,
+            conn=conn,
+        )
+        return resp
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving document pages: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error retrieving document pages",
+        )
@@ -1,16 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import JSONResponse
 from loguru import logger
+from psycopg import AsyncConnection
 from src.models.project import ProjectRequest
 from src.models.pagination import (
     PaginationParams,
     PaginationResponse,
     ParamRequest,
+    get_fields_params,
     get_pagination_params,
 )
 from src.worker_client import WorkerClient
-from src.auth import get_current_user_id
-from src.depedency import get_worker_client
+from src.auth import get_current_user_id, get_current_user_roles
+from src.depedency import get_db_connection, get_db_read_connection, get_worker_client
 
 router = APIRouter()
 
@@ -20,6 +22,7 @@ async def create_project(
     request: ProjectRequest,
     user_id: str = Depends(get_current_user_id),
     worker_client: WorkerClient = Depends(get_worker_client),
+    conn: AsyncConnection = Depends(get_db_connection),
 ):
     try:
         project_name = request.project_name
@@ -30,6 +33,7 @@ async def create_project(
             organization_id=organization_id,
             user_id=user_id,
             roles_allowed=["admin", "owner"],
+            conn=conn,
         )
         if not user_has_access:
             return JSONResponse(
@@ -40,6 +44,7 @@ async def create_project(
             project_info={"name": project_name, "description": project_description},
             organization_id=organization_id,
             user_id=user_id,
+            conn=conn,
         )
         return JSONResponse(
             status_code=200,
@@ -62,7 +67,9 @@ async def create_project(
 async def get_projects(
     request: ParamRequest = Depends(),  # note, project_id is not considered here.
     user_id: str = Depends(get_current_user_id),
+    token_roles: dict[str, str] | None = Depends(get_current_user_roles),
     worker_client: WorkerClient = Depends(get_worker_client),
+    conn: AsyncConnection = Depends(get_db_read_connection),
 ):
     """Endpoint to retrieve all projects with details"""
     try:
@@ -70,6 +77,8 @@ async def get_projects(
             organization_id=request.organization_id,
             user_id=user_id,
             roles_allowed=["member", "admin", "owner"],
+            token_roles=token_roles,
+            conn=conn,
         )
         if not user_has_access:
             return JSONResponse(
@@ -79,7 +88,7 @@ async def get_projects(
                 },
             )
         resp = await worker_client.get_all_projects_details(
-            organization_id=request.organization_id
+            organization_id=request.organization_id, conn=conn
         )
         return resp
     except HTTPException:
@@ -92,25 +101,32 @@ async def get_projects(
         )
 
 
-@router.get("/projects_info", response_model=PaginationResponse)
+@router.get(
+    "/projects_info",
+    response_model=PaginationResponse,
+    response_model_exclude_unset=True,
+)
 async def get_projects_info(
     user_id: str = Depends(get_current_user_id),
+    token_roles: dict[str, str] | None = Depends(get_current_user_roles),
     pagination: PaginationParams = Depends(get_pagination_params),
     params: ParamRequest = Depends(),
+    fields: list[str] | None = Depends(get_fields_params),
     worker_client: WorkerClient = Depends(get_worker_client),
+    conn: AsyncConnection = Depends(get_db_read_connection),
 ):
     """Endpoint to retrieve one or all projects' information with pagination"""
     try:
         project_id = params.project_id
         organization_id = params.organization_id
-        skip = pagination.skip
-        limit = pagination.limit
         if params.project_id:
             project_exists = await worker_client.check_user_access_to_project(
                 organization_id=organization_id,
                 project_id=project_id,
                 user_id=user_id,
                 roles_allowed=["member", "admin", "owner"],
+                token_roles=token_roles,
+                conn=conn,
             )
             if not project_exists:
                 return JSONResponse(
@@ -119,13 +135,13 @@ async def get_projects_info(
                         "message": "Project does not exist or user does not have access."
                     },
                 )
-            projects = [project_id]
-            total_projects = 1
         else:
             user_has_access = await worker_client.check_user_access_to_organization(
                 organization_id=organization_id,
                 user_id=user_id,
                 roles_allowed=["member", "admin", "owner"],
+                token_roles=token_roles,
+                conn=conn,
             )
             if not user_has_access:
                 return JSONResponse(
@@ -134,23 +150,16 @@ async def get_projects_info(
                         "message": "Organization does not exist or user does not have access."
                     },
                 )
-
-            all_projects = await worker_client.get_all_projects(
-                organization_id=organization_id
-            )
-            total_projects = len(all_projects)
-            projects = all_projects[skip : skip + limit]
         resp = await worker_client.get_projects_info(
-            organization_id=organization_id, projects=projects
+            organization_id=organization_id,
+            skip=pagination.skip,
+            limit=pagination.limit,
+            project_id=project_id,
+            fields=fields,
+            cursor=pagination.cursor,
+            count=pagination.count,
+            conn=conn,
         )
-
-        resp.page = (skip // limit) + 1
-        resp.per_page = pagination.limit
-        resp.total_pages = (total_projects + limit - 1) // limit
-        resp.has_next = skip + limit < total_projects
-        resp.has_previous = skip > 0
-        resp.total_count = total_projects
-
         return resp
     except HTTPException:
         raise
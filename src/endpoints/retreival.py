@@ -1,35 +1,93 @@
+import asyncio
+import json
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from loguru import logger
-from src.auth import get_current_user_id
+from src.auth import get_current_user_id, get_current_user_roles
 from src.depedency import get_pgai_client, get_worker_client
-from src.models.retreival import RAGRequest
+from src.models.retreival import BatchSearchRequest, RAGRequest, SearchRequest
+from src.models.document import DocumentSearchResult
 from src.pgai_client import PGAIClient
 from src.worker_client import WorkerClient
 
 router = APIRouter()
 
 
+def serialize_results(results: list[DocumentSearchResult]) -> list[dict]:
+    return [
+        {
+            "id": str(result.id),
+            "title": result.title,
+            "metadata": result.metadata,
+            "text": result.text,
+            "project_id": str(result.project_id),
+            "chunk": result.chunk,
+            "distance": result.distance,
+            "score": result.score,
+        }
+        for result in results
+    ]
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def rag_events(
+    pgai_client: PGAIClient,
+    query: str,
+    system_prompt: str,
+    relevant_chunks: list[DocumentSearchResult],
+):
+    """
+    Sources first, then the tokens of the answer and a final done event.
+    The response is cancelled when the client disconnects, which closes the LLM request.
+    """
+    yield sse_event("sources", {"data": serialize_results(relevant_chunks)})
+    try:
+        async for token in pgai_client.rag_stream(
+            query, system_prompt, relevant_chunks
+        ):
+            yield sse_event("token", {"content": token})
+    except asyncio.CancelledError:
+        logger.info("Client disconnected, RAG generation stopped")
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming RAG: {str(e)}")
+        yield sse_event("error", {"message": "Error performing RAG"})
+        return
+    yield sse_event("done", {})
+
+
 @router.post("/search")
 async def find_relevant_chunks(
-    request: RAGRequest,
+    request: SearchRequest,
     user_id: str = Depends(get_current_user_id),
+    token_roles: dict[str, str] | None = Depends(get_current_user_roles),
     worker_client: WorkerClient = Depends(get_worker_client),
     pgai_client: PGAIClient = Depends(get_pgai_client),
 ):
-    """Endpoint to find relevant chunks from a query"""
-    project_id = request.project_id
+    """
+    Endpoint to find relevant chunks from a query
+    Searches a project, several projects or the whole organization at once
+    """
     organization_id = request.organization_id
     query = request.query
     limit = request.limit
+    if request.project_id is not None:
+        project_ids = [request.project_id]
+    else:
+        # None searches every project of the organization
+        project_ids = request.project_ids
     try:
-        project_exists = await worker_client.check_user_access_to_project(
+        projects_exist = await worker_client.check_user_access_to_projects(
             organization_id=organization_id,
-            project_id=project_id,
+            project_ids=project_ids,
             user_id=user_id,
             roles_allowed=["member", "admin", "owner"],
+            token_roles=token_roles,
         )
-        if not project_exists:
+        if not projects_exist:
             return JSONResponse(
                 status_code=404,
                 content={
@@ -40,23 +98,17 @@ async def find_relevant_chunks(
             query=query,
             limit=limit,
             organization_id=organization_id,
-            project_id=project_id,
+            project_id=None,
+            project_ids=project_ids,
+            ef_search=request.ef_search,
+            mode=request.mode,
+            vector_weight=request.vector_weight,
+            text_weight=request.text_weight,
+            metadata_filter=request.metadata_filter,
+        )
+        return JSONResponse(
+            status_code=200, content={"data": serialize_results(results)}
         )
-        # Convert to serializable format
-        serializable_results = []
-        for result in results:
-            serializable_results.append(
-                {
-                    "id": str(result.id),
-                    "title": result.title,
-                    "metadata": result.metadata,
-                    "text": result.text,
-                    "project_id": str(result.project_id),
-                    "chunk": result.chunk,
-                    "distance": result.distance,
-                }
-            )
-        return JSONResponse(status_code=200, content={"data": serializable_results})
     except HTTPException:
         raise
     except Exception as e:
@@ -67,16 +119,72 @@ async def find_relevant_chunks(
         )
 
 
+@router.post("/search/batch")
+async def find_relevant_chunks_batch(
+    request: BatchSearchRequest,
+    user_id: str = Depends(get_current_user_id),
+    token_roles: dict[str, str] | None = Depends(get_current_user_roles),
+    worker_client: WorkerClient = Depends(get_worker_client),
+    pgai_client: PGAIClient = Depends(get_pgai_client),
+):
+    """
+    Endpoint to find relevant chunks for several queries of the same project
+    Results are returned in the order of the queries
+    """
+    project_id = request.project_id
+    organization_id = request.organization_id
+    try:
+        project_exists = await worker_client.check_user_access_to_project(
+            organization_id=organization_id,
+            project_id=project_id,
+            user_id=user_id,
+            roles_allowed=["member", "admin", "owner"],
+            token_roles=token_roles,
+        )
+        if not project_exists:
+            return JSONResponse(
+                status_code=404,
+                content={
+                    "message": "Project does not exist or user does not have access."
+                },
+            )
+        results = await pgai_client.find_relevant_chunks_batch(
+            queries=request.queries,
+            limit=request.limit,
+            organization_id=organization_id,
+            project_id=project_id,
+            ef_search=request.ef_search,
+            mode=request.mode,
+            vector_weight=request.vector_weight,
+            text_weight=request.text_weight,
+            metadata_filter=request.metadata_filter,
+        )
+        return JSONResponse(
+            status_code=200,
+            content={"data": [serialize_results(result) for result in results]},
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error performing batch search: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error performing batch search",
+        )
+
+
 @router.post("/rag")
 async def rag(
     request: RAGRequest,
     user_id: str = Depends(get_current_user_id),
+    token_roles: dict[str, str] | None = Depends(get_current_user_roles),
     worker_client: WorkerClient = Depends(get_worker_client),
     pgai_client: PGAIClient = Depends(get_pgai_client),
 ):
     """
     Endpoint to perform rag from a query
     Requires an LLM
+    With `stream`, the sources and the answer are sent as Server-Sent Events
     """
     project_id = request.project_id
     organization_id = request.organization_id
@@ -89,6 +197,7 @@ async def rag(
             project_id=project_id,
             user_id=user_id,
             roles_allowed=["member", "admin", "owner"],
+            token_roles=token_roles,
         )
         if not project_exists:
             return JSONResponse(
@@ -97,12 +206,35 @@ async def rag(
                     "message": "Project does not exist or user does not have access."
                 },
             )
+        if request.stream:
+            relevant_chunks = await pgai_client.find_relevant_chunks(
+                query=query,
+                limit=limit,
+                organization_id=organization_id,
+                project_id=project_id,
+                ef_search=request.ef_search,
+                mode=request.mode,
+                vector_weight=request.vector_weight,
+                text_weight=request.text_weight,
+                metadata_filter=request.metadata_filter,
+            )
+            return StreamingResponse(
+                rag_events(pgai_client, query, system_prompt, relevant_chunks),
+                media_type="text/event-stream",
+                # Proxies must not buffer the events
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
         result = await pgai_client.rag_query(
             query=query,
             limit=limit,
             system_prompt=system_prompt,
             organization_id=organization_id,
             project_id=project_id,
+            ef_search=request.ef_search,
+            mode=request.mode,
+            vector_weight=request.vector_weight,
+            text_weight=request.text_weight,
+            metadata_filter=request.metadata_filter,
         )
         return JSONResponse(status_code=200, content={"data": result})
     except HTTPException:
@@ -1,11 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import JSONResponse
-from src.depedency import get_worker_client
+from fastapi.responses import JSONResponse, PlainTextResponse
+from src.database import Database
+from src.configuration import Settings
+from src.depedency import (
+    get_database,
+    get_db_connection,
+    get_db_read_connection,
+    get_worker_client,
+    settings_provider,
+)
 from src.models.pagination import ParamRequest
-from src.models.system import StatInfo, SystemResponse
+from src.models.system import StatInfo, SystemResponse, VectorIndexStatus
+from src.pool_metrics import render_metrics
+from src.vector_index import get_vector_index_status
 from src.worker_client import WorkerClient
-from src.auth import get_current_user_id
+from src.auth import get_current_user_id, get_current_user_roles
 from loguru import logger
+from psycopg import AsyncConnection
 
 router = APIRouter()
 
@@ -13,8 +24,10 @@ router = APIRouter()
 @router.get("/errors", response_model=SystemResponse)
 async def get_errors(
     user_id: str = Depends(get_current_user_id),
+    token_roles: dict[str, str] | None = Depends(get_current_user_roles),
     params: ParamRequest = Depends(),
     worker_client: WorkerClient = Depends(get_worker_client),
+    conn: AsyncConnection = Depends(get_db_read_connection),
 ):
     """Endpoint to retrieve errors for a project (or all)"""
     try:
@@ -22,6 +35,8 @@ async def get_errors(
             organization_id=params.organization_id,
             user_id=user_id,
             roles_allowed=["member", "admin", "owner"],
+            token_roles=token_roles,
+            conn=conn,
         )
         if not user_has_access:
             return JSONResponse(
@@ -31,7 +46,7 @@ async def get_errors(
                 },
             )
         # TODO: integrate organization_id and project_id into this function
-        resp = await worker_client.get_errors()
+        resp = await worker_client.get_errors(conn=conn)
         return resp
     except HTTPException:
         raise
@@ -46,8 +61,10 @@ async def get_errors(
 @router.get("/stats", response_model=StatInfo)
 async def get_stats(
     user_id: str = Depends(get_current_user_id),
+    token_roles: dict[str, str] | None = Depends(get_current_user_roles),
     params: ParamRequest = Depends(),
     worker_client: WorkerClient = Depends(get_worker_client),
+    conn: AsyncConnection = Depends(get_db_read_connection),
 ):
     """Endpoint to retrieve system stats for a project (or all)"""
     try:
@@ -59,6 +76,8 @@ async def get_stats(
                 project_id=project_id,
                 user_id=user_id,
                 roles_allowed=["member", "admin", "owner"],
+                token_roles=token_roles,
+                conn=conn,
             )
             if not project_exists:
                 return JSONResponse(
@@ -73,6 +92,8 @@ async def get_stats(
                 organization_id=organization_id,
                 user_id=user_id,
                 roles_allowed=["member", "admin", "owner"],
+                token_roles=token_roles,
+                conn=conn,
             )
             if not user_has_access:
                 return JSONResponse(
@@ -81,13 +102,10 @@ async def get_stats(
                         "message": "Organization does not exist or user does not have access."
                     },
                 )
-            all_projects = await worker_client.get_all_projects(
-                organization_id=organization_id
-            )
-            projects = all_projects
+            projects = None  # all projects
 
         resp = await worker_client.get_stats(
-            organization_id=organization_id, projects=projects
+            organization_id=organization_id, projects=projects, conn=conn
         )
         return resp
     except HTTPException:
@@ -105,3 +123,96 @@ async def get_stats(
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(database: Database = Depends(get_database)):
+    """Connection pool and query metrics, in the Prometheus text format"""
+    return render_metrics(
+        [(pool, database.metrics[pool.name]) for pool in database.pools]
+    )
+
+
+@router.get("/organization/{org_id}/vector_index", response_model=VectorIndexStatus)
+async def vector_index_status(
+    org_id: str,
+    user_id: str = Depends(get_current_user_id),
+    token_roles: dict[str, str] | None = Depends(get_current_user_roles),
+    worker_client: WorkerClient = Depends(get_worker_client),
+    settings: Settings = Depends(settings_provider),
+    conn: AsyncConnection = Depends(get_db_connection),
+):
+    """
+    Endpoint to retrieve the state of the organization's vector index, including the progress of a build.
+    Reads from the primary, where the index is built.
+    """
+    try:
+        user_has_access = await worker_client.check_user_access_to_organization(
+            organization_id=org_id,
+            user_id=user_id,
+            roles_allowed=["admin", "owner"],
+            token_roles=token_roles,
+            conn=conn,
+        )
+        if not user_has_access:
+            return JSONResponse(
+                status_code=401,
+                content={
+                    "message": "Organization does not exist or user does not have access."
+                },
+            )
+        return await get_vector_index_status(conn, org_id, settings)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retreiving vector index status: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error retreiving vector index status",
+        )
+
+
+@router.post("/organization/{org_id}/vector_index/rebuild")
+async def rebuild_vector_index(
+    org_id: str,
+    user_id: str = Depends(get_current_user_id),
+    worker_client: WorkerClient = Depends(get_worker_client),
+    conn: AsyncConnection = Depends(get_db_connection),
+):
+    """
+    Endpoint to (re)build the organization's vector index with the current parameters, whatever its size.
+    The build is done by the worker within a few minutes, searches keep working meanwhile.
+    The role is not taken from the access token, a demoted admin can't request builds anymore.
+    """
+    try:
+        user_has_access = await worker_client.check_user_access_to_organization(
+            organization_id=org_id,
+            user_id=user_id,
+            roles_allowed=["admin", "owner"],
+            conn=conn,
+        )
+        if not user_has_access:
+            return JSONResponse(
+                status_code=401,
+                content={
+                    "message": "Organization does not exist or user does not have access."
+                },
+            )
+        await conn.execute(
+            """
+            INSERT INTO vector_indexes (org_id, rebuild_requested_at) VALUES (%s, NOW())
+            ON CONFLICT (org_id) DO UPDATE SET rebuild_requested_at = NOW();
+            """,
+            (org_id,),
+        )
+        return JSONResponse(
+            status_code=202, content={"message": "Vector index rebuild requested"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error requesting vector index rebuild: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error requesting vector index rebuild",
+        )
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from loguru import logger
-from src.depedency import get_db_pool
+from src.database import Database
+from src.depedency import get_database, get_db_pool
 from src.models.user import (
     CreateOrganizationRequest,
     CreateOrganizationResponse,
@@ -9,20 +10,41 @@ from src.models.user import (
     OrganizationUserKickRequest,
     OrganizationUserKickResponse,
     OrganizationUserRequest,
+    RefreshTokenRequest,
     UserRequest,
     UserResponse,
 )
 from src.auth import (
     get_current_user_id,
-    verify_password,
-    hash_password,
+    averify_password,
+    ahash_password,
+    decode_jwt_token,
+    generate_access_token,
     generate_jwt_token,
+    generate_refresh_token,
 )
+from src.configuration import config
 from src.utils import create_org_schema
 
 router = APIRouter()
 
 
+def build_user_response(user_id: str, org_roles: dict[str, str]) -> UserResponse:
+    """
+    Issues the tokens of a user. With JWT_ROLE_CLAIMS, a short-lived access token
+    embedding the organization roles and a refresh token, otherwise a single long-lived token.
+    """
+    if config.JWT_ROLE_CLAIMS:
+        return UserResponse(
+            token=generate_access_token(user_id=user_id, org_roles=org_roles),
+            refresh_token=generate_refresh_token(user_id=user_id),
+            org_ids=list(org_roles),
+        )
+    return UserResponse(
+        token=generate_jwt_token(user_id=user_id), org_ids=list(org_roles)
+    )
+
+
 @router.post("/login", response_model=UserResponse)
 async def login(body: UserRequest, pool=Depends(get_db_pool)):
     try:
@@ -33,7 +55,7 @@ async def login(body: UserRequest, pool=Depends(get_db_pool)):
                 await cur.execute(
                     """
                         SELECT u.id, u.username, u.password_hash,
-                        COALESCE(ARRAY_AGG(uo.org_id) FILTER (WHERE uo.org_id IS NOT NULL), ARRAY[]::uuid[]) as org_ids
+                        COALESCE(JSONB_OBJECT_AGG(uo.org_id, uo.role) FILTER (WHERE uo.org_id IS NOT NULL), '{}'::jsonb) as org_roles
                         FROM users u
                         LEFT JOIN user_org uo ON u.id = uo.user_id
                         WHERE u.username = %s
@@ -42,26 +64,27 @@ async def login(body: UserRequest, pool=Depends(get_db_pool)):
                     (username,),
                 )
                 user = await cur.fetchone()
-                if not user:
-                    raise HTTPException(
-                        status_code=401,
-                        detail="Invalid username or password",
-                    )
-                if not verify_password(password, user[2]):
-                    raise HTTPException(
-                        status_code=401,
-                        detail="Invalid username or password",
-                    )
-                # generate JWT token that includes user id and expiration
-                token = generate_jwt_token(user_id=str(user[0]))
-                await cur.execute(
-                    """
-                    UPDATE users SET last_login = NOW() WHERE id = %s;
-                    """,
-                    (str(user[0]),),
-                )
-                await conn.commit()
-        return UserResponse(token=token, org_ids=user[3])
+        if not user:
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid username or password",
+            )
+        # the connection is released while the password is checked
+        if not await averify_password(password, user[2]):
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid username or password",
+            )
+        # generate JWT token that includes user id and expiration
+        user_response = build_user_response(user_id=str(user[0]), org_roles=user[3])
+        async with pool.connection() as conn:
+            await conn.execute(
+                """
+                UPDATE users SET last_login = NOW() WHERE id = %s;
+                """,
+                (str(user[0]),),
+            )
+        return user_response
 
     except HTTPException:
         raise
@@ -74,11 +97,17 @@ async def login(body: UserRequest, pool=Depends(get_db_pool)):
 
 
 @router.post("/signup", response_model=UserResponse)
-async def signup(body: UserRequest, pool=Depends(get_db_pool)):
+async def signup(
+    body: UserRequest,
+    pool=Depends(get_db_pool),
+    database: Database = Depends(get_database),
+):
     try:
         username = body.username
         password = body.password
         is_service_account = body.is_service_account
+        # hashed before taking a connection, so it isn't held while hashing
+        hashed_password = await ahash_password(password)
         async with pool.connection() as conn:
             async with conn.transaction():
                 async with conn.cursor() as cur:
@@ -94,7 +123,6 @@ async def signup(body: UserRequest, pool=Depends(get_db_pool)):
                             status_code=400,
                             detail="Username already exists",
                         )
-                    hashed_password = hash_password(password)
                     await cur.execute(
                         """
                             INSERT INTO users (username, password_hash, is_service_account, created_at, last_login)
@@ -138,9 +166,13 @@ async def signup(body: UserRequest, pool=Depends(get_db_pool)):
                             detail="Error creating user and default organization",
                         )
                     await create_org_schema(cur, str(org_result[0]))
-                    token = generate_jwt_token(user_id=str(user_result[0]))
+                    database.mark_write(str(org_result[0]))
+                    user_response = build_user_response(
+                        user_id=str(user_result[0]),
+                        org_roles={str(org_result[0]): "owner"},
+                    )
                     # await conn.commit() # transaction commits automatically
-        return UserResponse(token=token, org_ids=[org_result[0]])
+        return user_response
 
     except HTTPException:
         raise
@@ -152,11 +184,99 @@ async def signup(body: UserRequest, pool=Depends(get_db_pool)):
         )
 
 
+@router.post("/refresh", response_model=UserResponse)
+async def refresh(body: RefreshTokenRequest, pool=Depends(get_db_pool)):
+    """
+    Endpoint to exchange a refresh token for a new access token with up to date roles.
+    The refresh token is rotated: it is revoked and a new one is returned.
+    """
+    payload = decode_jwt_token(body.refresh_token)
+    if payload.get("type") != "refresh":
+        raise HTTPException(status_code=401, detail="Invalid token")
+    try:
+        async with pool.connection() as conn:
+            async with conn.transaction():
+                async with conn.cursor() as cur:
+                    # a refresh token already revoked is rejected, even if not expired
+                    await cur.execute(
+                        """
+                        INSERT INTO revoked_tokens (jti, expires_at)
+                        VALUES (%s, TO_TIMESTAMP(%s))
+                        ON CONFLICT (jti) DO NOTHING
+                        RETURNING jti;
+                        """,
+                        (payload["jti"], payload["exp"]),
+                    )
+                    if not await cur.fetchone():
+                        raise HTTPException(
+                            status_code=401, detail="Token has been revoked"
+                        )
+                    await cur.execute(
+                        """
+                        SELECT u.id,
+                        COALESCE(JSONB_OBJECT_AGG(uo.org_id, uo.role) FILTER (WHERE uo.org_id IS NOT NULL), '{}'::jsonb) as org_roles
+                        FROM users u
+                        LEFT JOIN user_org uo ON u.id = uo.user_id
+                        WHERE u.id = %s
+                        GROUP BY u.id;
+                        """,
+                        (payload["user_id"],),
+                    )
+                    user = await cur.fetchone()
+                    if not user:
+                        raise HTTPException(status_code=401, detail="Invalid token")
+        return build_user_response(user_id=str(user[0]), org_roles=user[1])
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error refreshing token: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error refreshing token",
+        )
+
+
+@router.post("/logout")
+async def logout(body: RefreshTokenRequest, pool=Depends(get_db_pool)):
+    """
+    Endpoint to revoke a refresh token.
+    Access tokens issued from it stay valid until they expire.
+    """
+    payload = decode_jwt_token(body.refresh_token)
+    if payload.get("type") != "refresh":
+        raise HTTPException(status_code=401, detail="Invalid token")
+    try:
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    INSERT INTO revoked_tokens (jti, expires_at)
+                    VALUES (%s, TO_TIMESTAMP(%s))
+                    ON CONFLICT (jti) DO NOTHING;
+                    """,
+                    (payload["jti"], payload["exp"]),
+                )
+                # expired tokens are rejected anyway, no need to keep them
+                await cur.execute(
+                    "DELETE FROM revoked_tokens WHERE expires_at < NOW();"
+                )
+        return {"message": "Logged out"}
+
+    except Exception as e:
+        logger.error(f"Error during logout: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error during logout",
+        )
+
+
 @router.post("/create_organization")
 async def create_organization(
     request: CreateOrganizationRequest,
     user_id: str = Depends(get_current_user_id),
     pool=Depends(get_db_pool),
+    database: Database = Depends(get_database),
 ):
     """
     Endpoint to create a new organization for the current user.
@@ -203,6 +323,7 @@ async def create_organization(
 
                     # Create schema and tables for the new organization
                     await create_org_schema(cur, org_id)
+                    database.mark_write(org_id)
 
         return CreateOrganizationResponse(id=org_id)
 
@@ -406,6 +527,7 @@ async def add_user_to_organization(
     request: OrganizationUserRequest,
     user_id: str = Depends(get_current_user_id),
     pool=Depends(get_db_pool),
+    database: Database = Depends(get_database),
 ):
     """
     Endpoint to add a user to an organization.
@@ -479,6 +601,7 @@ async def add_user_to_organization(
                     )
                     user_org_result = await cur.fetchone()
                     user_org_id, user_joined_at = user_org_result
+                    database.mark_write(org_id)
                     return OrganizationUserInfo(
                         user_id=str(user_org_id),
                         username=username,
@@ -500,6 +623,7 @@ async def kick_user_from_organization(
     request: OrganizationUserKickRequest,
     user_id: str = Depends(get_current_user_id),
     pool=Depends(get_db_pool),
+    database: Database = Depends(get_database),
 ):
     """
     Endpoint to kick a user from an organization.
@@ -578,6 +702,7 @@ async def kick_user_from_organization(
                         (org_id, user_to_kick_id),
                     )
 
+                    database.mark_write(org_id)
                     return OrganizationUserKickResponse(username=username_to_kick)
 
     except HTTPException:
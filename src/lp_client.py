@@ -6,8 +6,11 @@ from src.configuration import config
 class LlamaParseClient:
     def __init__(self, auto_mode=True):
         self.api_key = config.LLAMA_CLOUD_API_KEY
+        # Documents are returned as a list of pages
         self.client = LlamaParse(
-            api_key=self.api_key, auto_mode=auto_mode, split_by_page=False
+            api_key=self.api_key,
+            auto_mode=auto_mode,
+            split_by_page=True,
         )
 
     async def aprocess_document(self, file_path, extra_info):
@@ -9,42 +9,18 @@ from src.endpoints.retreival import router as retreival_router
 from src.endpoints.system import router as system_router
 from src.endpoints.user import router as user_router, signup
 from src.models.user import UserRequest
-import psycopg
 from psycopg_pool import AsyncConnectionPool
-from pgvector.psycopg import register_vector_async
 from loguru import logger
-import pgai
+from src.access_cache import AccessCache
+from src.cache import TTLCache
+from src.database import db
 from src.lp_client import LlamaParseClient
-from src.pgai_client import PGAIClient
+from src.embedding_cache import create_embedding_cache
+from src.pgai_client import PGAIClient, create_openai_client
+from src.migrations import run_migrations
 from src.worker_client import WorkerClient
 
 
-# Create a connection pool to the database for efficient connection management
-async def setup_pgvector_psycopg(conn: psycopg.AsyncConnection):
-    await register_vector_async(conn)
-
-
-async def ensure_pgai_installed(pool: AsyncConnectionPool, settings: Settings) -> None:
-    """Install pgai only if not already present"""
-    try:
-        async with pool.connection() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(
-                    "SELECT schema_name FROM information_schema.schemata WHERE schema_name = 'ai';"
-                )
-                result = await cur.fetchone()
-                exists = result[0] if result else False
-                if not exists:
-                    logger.info("Installing pgai...")
-                    pgai.install(
-                        settings.DB_URL
-                    )  # install the necessary catalog tables and functions into the ai schema of the database.
-                else:
-                    logger.info("pgai already installed, skipping")
-    except Exception as e:
-        logger.error(f"Error installing pgai: {str(e)}")
-
-
 async def create_default_admin(
     pool: AsyncConnectionPool, username: str, password: str
 ) -> None:
@@ -62,6 +38,7 @@ async def create_default_admin(
         await signup(
             UserRequest(username=username, password=password),
             pool,
+            db,
         )
         logger.info(f"Default admin user '{username}' created")
     except Exception as e:
@@ -73,18 +50,20 @@ def lifecycle_provider(settings: Settings):
     async def lifespan(app: FastAPI):
         try:
             app.settings = settings
-            app.pool = AsyncConnectionPool(
-                settings.DB_URL,
-                min_size=settings.DB_POOL_MIN_SIZE,
-                max_size=settings.DB_POOL_MAX_SIZE,
-                open=False,
-                max_idle=settings.DB_POOL_IDLE_TIMEOUT,
-                max_lifetime=settings.DB_POOL_LIFETIME_TIMEOUT,
-                configure=setup_pgvector_psycopg,
-            )
-            await app.pool.open()
+            # A single pool shared by the endpoints and the clients
+            app.db = db
+            await app.db.connect(settings)
+            app.pool = app.db.pool
 
-            await ensure_pgai_installed(app.pool, settings)
+            try:
+                await app.db.ensure_pgai_installed()
+            except Exception as e:
+                logger.error(f"Error installing pgai: {str(e)}")
+
+            try:
+                await run_migrations(settings.DB_SESSION_URL)
+            except Exception as e:
+                logger.error(f"Error running schema migrations: {str(e)}")
 
             if settings.CREATE_DEFAULT_ADMIN_USER:
                 await create_default_admin(
@@ -101,14 +80,35 @@ def lifecycle_provider(settings: Settings):
             else:
                 app.parser_client = None
 
+            app.access_cache = AccessCache(
+                max_size=settings.ACCESS_CACHE_MAX_SIZE, ttl=settings.ACCESS_CACHE_TTL
+            )
+            app.access_cache.start_listener(settings.DB_SESSION_URL)
             app.worker_client = WorkerClient(
-                app.parser_client, client_type=app.parser_client.__class__.__name__
+                app.parser_client,
+                client_type=app.parser_client.__class__.__name__,
+                access_cache=app.access_cache,
+                database=app.db,
+            )
+            # One OpenAI client per process, its connections are reused by every search
+            app.pgai_client = PGAIClient(
+                config=settings,
+                database=app.db,
+                openai_client=create_openai_client(settings),
+                embedding_cache=create_embedding_cache(settings),
+                search_cache=TTLCache(
+                    max_size=settings.SEARCH_CACHE_MAX_SIZE,
+                    ttl=settings.SEARCH_CACHE_TTL,
+                ),
             )
-            app.pgai_client = PGAIClient()
 
             yield
         finally:
-            await app.pool.close()
+            if getattr(app, "access_cache", None) is not None:
+                await app.access_cache.stop_listener()
+            if getattr(app, "pgai_client", None) is not None:
+                await app.pgai_client.close()
+            await db.disconnect()
             logger.info("Shutting down application...")
 
     return lifespan
@@ -0,0 +1,478 @@
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+from loguru import logger
+import psycopg
+from psycopg import AsyncCursor
+from src.access_cache import USER_ORG_CHANNEL
+from src.constant import TEXT_SEARCH_CONFIG, TableNames
+
+# Schema name under which the migrations of the shared (public) tables are recorded
+GLOBAL_SCHEMA = "public"
+# Key of the advisory lock taken while migrating so that only one process migrates at a time
+MIGRATION_LOCK_KEY = 7261849301
+
+
+@dataclass
+class Migration:
+    """
+    A versioned schema change.
+    `apply` receives a cursor, the schema name and whether indexes may be built concurrently.
+    Non-transactional migrations run outside of a transaction when applied to existing schemas
+    so that their indexes can be built with CREATE INDEX CONCURRENTLY.
+    """
+
+    version: int
+    name: str
+    apply: Callable[[AsyncCursor, str, bool], Awaitable[None]]
+    transactional: bool = True
+
+
+async def create_index(
+    cur, schema: str, name: str, definition: str, concurrently: bool
+):
+    """
+    Creates an index if it does not exist yet.
+    `definition` is everything after `ON "{schema}".`, e.g. `document (status)`.
+    """
+    if concurrently:
+        # A failed concurrent build leaves an invalid index behind, drop it before retrying
+        await cur.execute(
+            """
+            SELECT NOT i.indisvalid FROM pg_index i WHERE i.indexrelid = to_regclass(%s);
+            """,
+            (f'"{schema}".{name}',),
+        )
+        invalid = await cur.fetchone()
+        if invalid and invalid[0]:
+            await cur.execute(f'DROP INDEX CONCURRENTLY "{schema}".{name};')
+    await cur.execute(
+        f"""
+        CREATE INDEX {"CONCURRENTLY " if concurrently else ""}IF NOT EXISTS {name}
+        ON "{schema}".{definition};
+        """
+    )
+
+
+async def create_document_page_table(cur, org_id: str, concurrently: bool):
+    """
+    Creates the table holding the parsed text of each document page.
+    """
+    await cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{org_id}".{TableNames.reserved_document_page_table_name} (
+            document_id UUID NOT NULL REFERENCES "{org_id}".{TableNames.reserved_document_table_name}(id) ON DELETE CASCADE,
+            page_number INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (document_id, page_number)
+        );
+    """)
+
+
+async def create_document_stats(cur, org_id: str, concurrently: bool):
+    """
+    Creates the per-project, per-status document counters and the trigger maintaining them.
+    Only non-deleted documents are counted. The counters are backfilled when they are first created.
+    """
+    await cur.execute(
+        "SELECT to_regclass(%s);",
+        (f'"{org_id}".{TableNames.reserved_document_stats_table_name}',),
+    )
+    if (await cur.fetchone())[0] is not None:
+        return
+
+    org_id_safe = f"org_{org_id.replace('-', '_')}"
+    await cur.execute(f"""
+        CREATE TABLE "{org_id}".{TableNames.reserved_document_stats_table_name} (
+            project_id UUID NOT NULL REFERENCES "{org_id}".{TableNames.reserved_project_table_name}(id) ON DELETE CASCADE,
+            status TEXT NOT NULL,
+            document_count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (project_id, status)
+        );
+    """)
+    await cur.execute(f"""
+            CREATE OR REPLACE FUNCTION update_document_stats_{org_id_safe}()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP = 'UPDATE'
+                    AND OLD.project_id = NEW.project_id
+                    AND OLD.status IS NOT DISTINCT FROM NEW.status
+                    AND (OLD.deleted_at IS NULL) = (NEW.deleted_at IS NULL) THEN
+                    RETURN NULL;
+                END IF;
+
+                -- Remove the previous state of the document from the counters
+                IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.deleted_at IS NULL AND OLD.status IS NOT NULL THEN
+                    UPDATE "{org_id}".{TableNames.reserved_document_stats_table_name}
+                    SET document_count = document_count - 1
+                    WHERE project_id = OLD.project_id AND status = OLD.status;
+                END IF;
+
+                -- Add the new state of the document to the counters
+                IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.deleted_at IS NULL AND NEW.status IS NOT NULL THEN
+                    INSERT INTO "{org_id}".{TableNames.reserved_document_stats_table_name} AS s (project_id, status, document_count)
+                    VALUES (NEW.project_id, NEW.status, 1)
+                    ON CONFLICT (project_id, status)
+                    DO UPDATE SET document_count = s.document_count + 1;
+                END IF;
+
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """)
+    # Block document writes until the backfill is done so that no change is missed
+    await cur.execute(f"""
+        LOCK TABLE "{org_id}".{TableNames.reserved_document_table_name} IN SHARE ROW EXCLUSIVE MODE;
+    """)
+    await cur.execute(f"""
+            CREATE TRIGGER after_document_change_stats
+            AFTER INSERT OR DELETE OR UPDATE OF project_id, status, deleted_at
+            ON "{org_id}".{TableNames.reserved_document_table_name}
+            FOR EACH ROW
+            EXECUTE FUNCTION update_document_stats_{org_id_safe}();
+        """)
+    await cur.execute(f"""
+        INSERT INTO "{org_id}".{TableNames.reserved_document_stats_table_name} (project_id, status, document_count)
+        SELECT project_id, status, COUNT(*)
+        FROM "{org_id}".{TableNames.reserved_document_table_name}
+        WHERE deleted_at IS NULL
+        AND status IS NOT NULL
+        GROUP BY project_id, status;
+    """)
+
+
+async def create_document_listing_index(cur, org_id: str, concurrently: bool):
+    """Index for listing, counting and paginating the non-deleted documents of projects"""
+    await create_index(
+        cur,
+        org_id,
+        "document_project_id_created_at_idx",
+        f"{TableNames.reserved_document_table_name} (project_id, created_at DESC, id DESC) WHERE deleted_at IS NULL",
+        concurrently,
+    )
+
+
+async def create_document_status_index(cur, org_id: str, concurrently: bool):
+    """Index for finding the documents waiting to be parsed"""
+    await create_index(
+        cur,
+        org_id,
+        "document_status_idx",
+        f"{TableNames.reserved_document_table_name} (status) WHERE deleted_at IS NULL",
+        concurrently,
+    )
+
+
+async def create_pgai_document_id_index(cur, org_id: str, concurrently: bool):
+    """Index for finding the chunks source of a document, e.g. when soft deleting it"""
+    await create_index(
+        cur,
+        org_id,
+        "pgai_document_id_idx",
+        f"{TableNames.reserved_pgai_table_name} ((metadata->>'id')) WHERE deleted_at IS NULL",
+        concurrently,
+    )
+
+
+async def create_project_data_version(cur, org_id: str, concurrently: bool):
+    """
+    Creates the per-project data version and the triggers bumping it whenever the searchable
+    chunks of a project change (new, updated, deleted or re-embedded), so that cached search
+    results can be invalidated.
+    """
+    org_id_safe = f"org_{org_id.replace('-', '_')}"
+    pgai_table = TableNames.reserved_pgai_table_name
+    await cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{org_id}".{TableNames.reserved_project_data_version_table_name} (
+            project_id UUID PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        );
+    """)
+    await cur.execute(f"""
+            CREATE OR REPLACE FUNCTION bump_project_data_version_{org_id_safe}()
+            RETURNS TRIGGER AS $$
+            DECLARE
+                project_ids UUID[];
+            BEGIN
+                IF TG_TABLE_NAME = '{pgai_table}' THEN
+                    IF TG_OP = 'INSERT' THEN
+                        SELECT array_agg(DISTINCT project_id) INTO project_ids FROM new_rows;
+                    ELSIF TG_OP = 'DELETE' THEN
+                        SELECT array_agg(DISTINCT project_id) INTO project_ids FROM old_rows;
+                    ELSE
+                        SELECT array_agg(DISTINCT project_id) INTO project_ids
+                        FROM (SELECT project_id FROM old_rows UNION SELECT project_id FROM new_rows) r;
+                    END IF;
+                -- The embeddings only reference their chunk
+                ELSIF TG_OP = 'DELETE' THEN
+                    SELECT array_agg(DISTINCT s.project_id) INTO project_ids
+                    FROM old_rows o JOIN "{org_id}".{pgai_table} s ON s.id = o.id;
+                ELSE
+                    SELECT array_agg(DISTINCT s.project_id) INTO project_ids
+                    FROM new_rows n JOIN "{org_id}".{pgai_table} s ON s.id = n.id;
+                END IF;
+
+                -- Sorted so that concurrent statements lock the versions in the same order
+                INSERT INTO "{org_id}".{TableNames.reserved_project_data_version_table_name} AS v (project_id, version)
+                SELECT project_id, 1 FROM unnest(project_ids) AS project_id
+                WHERE project_id IS NOT NULL
+                ORDER BY project_id
+                ON CONFLICT (project_id)
+                DO UPDATE SET version = v.version + 1;
+
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """)
+    # Statement level triggers, so that a batch of chunks bumps the version once
+    for table in (pgai_table, f"{pgai_table}_embedding_store"):
+        for event, transition_tables in (
+            ("INSERT", "NEW TABLE AS new_rows"),
+            ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+            ("DELETE", "OLD TABLE AS old_rows"),
+        ):
+            await cur.execute(f"""
+                DROP TRIGGER IF EXISTS after_{event.lower()}_data_version ON "{org_id}".{table};
+
+                CREATE TRIGGER after_{event.lower()}_data_version
+                AFTER {event} ON "{org_id}".{table}
+                REFERENCING {transition_tables}
+                FOR EACH STATEMENT
+                EXECUTE FUNCTION bump_project_data_version_{org_id_safe}();
+            """)
+
+
+async def create_pgai_project_index(cur, org_id: str, concurrently: bool):
+    """Index for the exact searches and size estimates restricted to a project"""
+    await create_index(
+        cur,
+        org_id,
+        "pgai_project_id_idx",
+        f"{TableNames.reserved_pgai_table_name} (project_id) WHERE deleted_at IS NULL",
+        concurrently,
+    )
+
+
+async def create_chunk_text_index(cur, org_id: str, concurrently: bool):
+    """Full-text index of the embedded chunks, for the hybrid searches"""
+    await create_index(
+        cur,
+        org_id,
+        "pgai_embedding_store_chunk_text_idx",
+        f"{TableNames.reserved_pgai_table_name}_embedding_store USING gin (to_tsvector('{TEXT_SEARCH_CONFIG}', chunk))",
+        concurrently,
+    )
+
+
+async def create_pgai_metadata_index(cur, org_id: str, concurrently: bool):
+    """Index of the documents metadata, for the searches filtered by metadata containment"""
+    await create_index(
+        cur,
+        org_id,
+        "pgai_metadata_idx",
+        f"{TableNames.reserved_pgai_table_name} USING gin (metadata jsonb_path_ops) WHERE deleted_at IS NULL",
+        concurrently,
+    )
+
+
+async def create_user_org_index(cur, schema: str, concurrently: bool):
+    """Index for the membership checks done on every request"""
+    await create_index(
+        cur,
+        schema,
+        "user_org_user_id_org_id_idx",
+        "user_org (user_id, org_id)",
+        concurrently,
+    )
+
+
+async def create_user_org_notify_trigger(cur, schema: str, concurrently: bool):
+    """Notifies the API processes of membership changes so they can invalidate their access cache"""
+    await cur.execute(f"""
+        CREATE OR REPLACE FUNCTION "{schema}".notify_user_org_changed()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM pg_notify(
+                    '{USER_ORG_CHANNEL}',
+                    json_build_object('user_id', OLD.user_id, 'org_id', OLD.org_id)::text
+                );
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM pg_notify(
+                    '{USER_ORG_CHANNEL}',
+                    json_build_object('user_id', NEW.user_id, 'org_id', NEW.org_id)::text
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS after_user_org_change ON "{schema}".user_org;
+
+        CREATE TRIGGER after_user_org_change
+        AFTER INSERT OR UPDATE OR DELETE ON "{schema}".user_org
+        FOR EACH ROW
+        EXECUTE FUNCTION "{schema}".notify_user_org_changed();
+    """)
+
+
+async def create_revoked_tokens_table(cur, schema: str, concurrently: bool):
+    """Refresh tokens revoked by a logout or a refresh, kept until they expire"""
+    await cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{schema}".revoked_tokens (
+            jti UUID PRIMARY KEY,
+            expires_at TIMESTAMPTZ NOT NULL
+        );
+    """)
+
+
+async def create_vector_indexes_table(cur, schema: str, concurrently: bool):
+    """State of the vector index of each organization, maintained by the worker"""
+    await cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{schema}".vector_indexes (
+            org_id UUID PRIMARY KEY REFERENCES "{schema}".organizations(id) ON DELETE CASCADE,
+            rebuild_requested_at TIMESTAMPTZ,
+            build_started_at TIMESTAMPTZ,
+            built_at TIMESTAMPTZ,
+            error TEXT
+        );
+    """)
+
+
+# Migrations applied to each organization schema, in order
+ORG_MIGRATIONS = [
+    Migration(1, "create document page table", create_document_page_table),
+    Migration(2, "create document stats", create_document_stats),
+    Migration(
+        3,
+        "create document listing index",
+        create_document_listing_index,
+        transactional=False,
+    ),
+    Migration(
+        4,
+        "create document status index",
+        create_document_status_index,
+        transactional=False,
+    ),
+    Migration(
+        5,
+        "create pgai document id index",
+        create_pgai_document_id_index,
+        transactional=False,
+    ),
+    Migration(6, "create project data version", create_project_data_version),
+    Migration(
+        7,
+        "create pgai project index",
+        create_pgai_project_index,
+        transactional=False,
+    ),
+    Migration(
+        8,
+        "create chunk text index",
+        create_chunk_text_index,
+        transactional=False,
+    ),
+    Migration(
+        9,
+        "create pgai metadata index",
+        create_pgai_metadata_index,
+        transactional=False,
+    ),
+]
+
+# Migrations applied to the shared tables of the public schema, in order
+GLOBAL_MIGRATIONS = [
+    Migration(1, "create user org index", create_user_org_index, transactional=False),
+    Migration(2, "create user org notify trigger", create_user_org_notify_trigger),
+    Migration(3, "create revoked tokens table", create_revoked_tokens_table),
+    Migration(4, "create vector indexes table", create_vector_indexes_table),
+]
+
+
+async def create_migrations_table(cur):
+    await cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            schema_name TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (schema_name, version)
+        );
+    """)
+
+
+async def record_migration(cur, schema: str, migration: Migration):
+    await cur.execute(
+        """
+        INSERT INTO schema_migrations (schema_name, version, name)
+        VALUES (%s, %s, %s);
+        """,
+        (schema, migration.version, migration.name),
+    )
+
+
+async def apply_org_migrations(cur, org_id: str):
+    """
+    Applies all the organization migrations to a newly created organization schema.
+    Runs inside the transaction creating the organization, so indexes are built non-concurrently
+    (the tables are empty).
+    """
+    for migration in ORG_MIGRATIONS:
+        await migration.apply(cur, org_id, False)
+        await record_migration(cur, org_id, migration)
+
+
+async def migrate_schema(conn, schema: str, migrations: list[Migration]) -> int:
+    """
+    Applies the pending migrations to one schema, in order.
+    Expects an autocommit connection. Returns the number of migrations applied.
+    """
+    async with conn.cursor() as cur:
+        await cur.execute(
+            "SELECT version FROM schema_migrations WHERE schema_name = %s;",
+            (schema,),
+        )
+        applied_versions = {row[0] for row in await cur.fetchall()}
+    applied = 0
+    for migration in migrations:
+        if migration.version in applied_versions:
+            continue
+        logger.info(
+            f"Applying migration {migration.version} ({migration.name}) to schema {schema}"
+        )
+        if migration.transactional:
+            async with conn.transaction():
+                async with conn.cursor() as cur:
+                    await migration.apply(cur, schema, False)
+                    await record_migration(cur, schema, migration)
+        else:
+            async with conn.cursor() as cur:
+                await migration.apply(cur, schema, True)
+                await record_migration(cur, schema, migration)
+        applied += 1
+    return applied
+
+
+async def run_migrations(db_url: str):
+    """
+    Brings the public schema and every existing organization schema to the latest version.
+    Uses a dedicated session (advisory lock, CREATE INDEX CONCURRENTLY), so `db_url` must not
+    point to a transaction pooler.
+    """
+    async with await psycopg.AsyncConnection.connect(db_url, autocommit=True) as conn:
+        await conn.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_KEY,))
+        try:
+            async with conn.cursor() as cur:
+                await create_migrations_table(cur)
+            applied = await migrate_schema(conn, GLOBAL_SCHEMA, GLOBAL_MIGRATIONS)
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT id FROM organizations;")
+                org_ids = [str(row[0]) for row in await cur.fetchall()]
+            for org_id in org_ids:
+                applied += await migrate_schema(conn, org_id, ORG_MIGRATIONS)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_KEY,))
+    logger.info(
+        f"Schema migrations up to date for {len(org_ids)} organizations ({applied} applied)"
+    )
@@ -19,6 +19,7 @@ class DocumentSearchResult:
     project_id: str
     chunk: str
     distance: float
+    score: float | None = None  # relevance of hybrid searches, higher is better
 
     def __str__(self):
         return f"""SearchResult:
@@ -39,29 +40,31 @@ class DocumentStatus(str, Enum):
 
 
 class DocumentInfo(BaseModel):
+    # Only document_id is always present, the rest depend on the requested fields
     document_id: uuid.UUID
-    document_uploaded_name: str
-    metadata: dict
-    status: DocumentStatus
-    uploaded_by_user_name: str
-    created_at: datetime.datetime
-    project_id: uuid.UUID
-    project_name: str
-    organization_id: str
+    document_uploaded_name: str | None = None
+    metadata: dict | None = None
+    status: DocumentStatus | None = None
+    uploaded_by_user_name: str | None = None
+    created_at: datetime.datetime | None = None
+    project_id: uuid.UUID | None = None
+    project_name: str | None = None
+    organization_id: str | None = None
 
 
 class DocumentDetail(BaseModel):
-    document_name: str
-    document_type: str
-    metadata: dict
-    document_status: DocumentStatus
+    # Only document_id is always present, the rest depend on the requested fields
+    document_name: str | None = None
+    document_type: str | None = None
+    metadata: dict | None = None
+    document_status: DocumentStatus | None = None
     document_id: uuid.UUID
-    created_at: datetime.datetime
+    created_at: datetime.datetime | None = None
     updated_at: datetime.datetime | None = None
     parsed_markdown_text: str | None = None
-    file_bytes: str
+    file_bytes: str | None = None
     summary: str | None = None
-    uploaded_by_user_name: str
+    uploaded_by_user_name: str | None = None
 
     @field_validator("file_bytes", mode="before")
     @classmethod
@@ -71,6 +74,17 @@ class DocumentDetail(BaseModel):
         return v
 
 
+class DocumentPage(BaseModel):
+    page_number: int
+    text: str
+
+
+class DocumentPagesResponse(BaseModel):
+    document_id: uuid.UUID
+    total_pages: int
+    pages: list[DocumentPage]
+
+
 class DocumentParamsRequest(BaseModel):
     """Document model"""
 
@@ -1,25 +1,95 @@
-from typing import Annotated
-from fastapi import Query
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Annotated, Any, Callable, Literal
+from fastapi import HTTPException, Query
 from pydantic import BaseModel, Field
 
 from src.models.document import DocumentInfo
 from src.models.project import ProjectInfo
 
 
+CountMode = Literal["exact", "estimated", "none"]
+
+
 class PaginationParams(BaseModel):
     skip: Annotated[int, Field(default=0, ge=0, description="Number of items to skip")]
     limit: Annotated[
         int, Field(default=10, ge=1, le=100, description="Number of items per page")
     ]
+    cursor: str | None = None
+    count: CountMode = "exact"
 
 
 def get_pagination_params(
     page: int = Query(1, ge=1, description="Page number (1-based)"),
     per_page: int = Query(10, ge=1, le=100, description="Items per page"),
+    cursor: str | None = Query(
+        None,
+        description="Cursor from a previous response's next_cursor or prev_cursor. Takes precedence over page",
+    ),
+    count: CountMode = Query(
+        "exact",
+        description="How to compute total_count: exact, estimated (planner estimate), or none",
+    ),
 ) -> PaginationParams:
     """Convert page-based to offset-based pagination"""
     skip = (page - 1) * per_page
-    return PaginationParams(skip=skip, limit=per_page)
+    return PaginationParams(skip=skip, limit=per_page, cursor=cursor, count=count)
+
+
+def encode_cursor(key: list, direction: Literal["next", "prev"]) -> str:
+    """
+    Encodes the sort key of a boundary item into an opaque cursor.
+    `next` cursors continue after the item, `prev` cursors continue before it.
+    """
+    payload = json.dumps({"k": key, "d": direction}, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def cursor_text(value: Any) -> str:
+    if not isinstance(value, str):
+        raise ValueError("Expected a string")
+    return value
+
+
+# Parsers of the sort keys of the cursors, one per column
+DOCUMENT_CURSOR_KEY = (datetime.fromisoformat, uuid.UUID)  # created_at, id
+PROJECT_CURSOR_KEY = (cursor_text, uuid.UUID)  # name, id
+
+
+def decode_cursor(
+    cursor: str, key_parsers: tuple[Callable[[Any], Any], ...]
+) -> tuple[list, Literal["next", "prev"]]:
+    """
+    Decodes a cursor created by `encode_cursor` into its sort key and direction.
+    The key is parsed with `key_parsers`, cursors that don't match are rejected.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        key, direction = payload["k"], payload["d"]
+        if (
+            not isinstance(key, list)
+            or len(key) != len(key_parsers)
+            or direction not in ("next", "prev")
+        ):
+            raise ValueError("Malformed cursor")
+        return [parse(value) for parse, value in zip(key_parsers, key)], direction
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def get_fields_params(
+    fields: str | None = Query(
+        None,
+        description="Comma-separated list of fields to return (all fields if omitted)",
+    ),
+) -> list[str] | None:
+    """Convert the comma-separated fields query param to a list of field names"""
+    if fields is None:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
 
 
 class ParamRequest(BaseModel):
@@ -37,3 +107,5 @@ class PaginationResponse(BaseModel):
     total_pages: int | None = None
     has_next: bool | None = None
     has_previous: bool | None = None
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
@@ -9,9 +9,10 @@ class ProjectRequest(BaseModel):
 
 
 class ProjectInfo(BaseModel):
+    # Only project_id is always present, the rest depend on the requested fields
     project_id: str
-    project_name: str
-    number_of_documents: int
+    project_name: str | None = None
+    number_of_documents: int | None = None
     created_at: datetime.datetime | None = None
     updated_at: datetime.datetime | None = None
     description: str | None = None
@@ -1,16 +1,94 @@
-from typing import Annotated
-from pydantic import BaseModel, Field, field_validator
+from typing import Annotated, Any, Literal
+from pydantic import BaseModel, Field, field_validator, model_validator
 import re
 
+SearchMode = Literal["vector", "hybrid"]
+
+
+class SearchOptions(BaseModel):
+    """Parameters shared by the search and RAG requests"""
 
-class RAGRequest(BaseModel):
     project_id: str
     organization_id: str
-    query: str
-    system_prompt: str | None = None
     limit: Annotated[
         int, Field(default=3, ge=1, description="Number of results to return")
     ]
+    ef_search: Annotated[
+        int | None,
+        Field(
+            default=None,
+            ge=1,
+            le=1000,
+            description="Candidates considered by the vector index, higher is slower with a better recall",
+        ),
+    ]
+    mode: SearchMode = Field(
+        default="vector",
+        description="vector, or hybrid to also match the words of the query with a full-text search",
+    )
+    vector_weight: Annotated[
+        float | None,
+        Field(
+            default=None,
+            ge=0,
+            description="Weight of the vector ranking in hybrid searches",
+        ),
+    ]
+    text_weight: Annotated[
+        float | None,
+        Field(
+            default=None,
+            ge=0,
+            description="Weight of the full-text ranking in hybrid searches",
+        ),
+    ]
+    metadata_filter: dict[str, Any] | None = Field(
+        default=None,
+        description='Only chunks of documents whose metadata contains this object, e.g. {"department": "legal", "year": 2025}',
+    )
+
+
+class SearchRequest(SearchOptions):
+    query: str
+    project_id: str | None = None
+    project_ids: Annotated[
+        list[str] | None,
+        Field(
+            default=None,
+            min_length=1,
+            max_length=100,
+            description="Projects searched together instead of a single `project_id`",
+        ),
+    ]
+    all_projects: bool = Field(
+        default=False,
+        description="Search every project of the organization instead of `project_id`",
+    )
+
+    @model_validator(mode="after")
+    def check_projects(self):
+        scopes = [self.project_id is not None, self.project_ids is not None]
+        if sum(scopes) + self.all_projects != 1:
+            raise ValueError(
+                "Exactly one of project_id, project_ids or all_projects must be given"
+            )
+        return self
+
+
+class BatchSearchRequest(SearchOptions):
+    queries: Annotated[
+        list[str],
+        Field(min_length=1, max_length=100, description="Queries searched at once"),
+    ]
+
+
+class RAGRequest(SearchOptions):
+    query: str
+    system_prompt: str | None = None
+    stream: bool = Field(
+        default=False,
+        description="Send the sources, then the answer as it is generated, as Server-Sent Events",
+    )
 
     @field_validator("system_prompt")
     @classmethod
@@ -17,3 +17,20 @@ class StatInfo(BaseModel):
 
 class SystemResponse(BaseModel):
     items: list[ErrorInfo]
+
+
+class VectorIndexStatus(BaseModel):
+    organization_id: str
+    index_exists: bool
+    valid: bool
+    building: bool
+    phase: str | None = None
+    progress: float | None = None  # between 0 and 1, while building
+    size_bytes: int | None = None
+    parameters: Dict[str, str] | None = None
+    estimated_chunks: int | None = None
+    threshold: int
+    rebuild_requested_at: datetime.datetime | None = None
+    build_started_at: datetime.datetime | None = None
+    built_at: datetime.datetime | None = None
+    error: str | None = None
@@ -20,6 +20,11 @@ class UserRequest(BaseModel):
 class UserResponse(BaseModel):
     token: str
     org_ids: list[UUID]
+    refresh_token: str | None = None  # only when JWT_ROLE_CLAIMS is enabled
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 
 class CreateOrganizationRequest(BaseModel):
@@ -7,95 +7,557 @@ if sys.platform == "win32":
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
 import os
-from typing import List
-from openai import AsyncOpenAI
+from dataclasses import replace
+from enum import Enum
+from typing import AsyncIterator, List
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from psycopg.rows import class_row
+from psycopg.types.json import Jsonb
 import re
+import uuid
 import numpy as np
 from src.configuration import Settings, config
 from src.models.document import DocumentSearchResult
-from src.database import db
-from src.constant import TableNames
+from src.models.retreival import SearchMode
+from src.database import Database, db
+from src.embedding_cache import EmbeddingCache
+from src.cache import MISSING, TTLCache
+from src.constant import TEXT_SEARCH_CONFIG, TableNames
+from src.vector_index import MAX_EF_SEARCH, MIN_EF_SEARCH, VECTOR_INDEX_NAME
 
 # TODO: move this elsewhere
 os.environ["OPENAI_API_KEY"] = config.OPENAI_API_KEY
 os.environ["OPENAI_BASE_URL"] = config.OPENAI_BASE_URL
 
 
+def create_openai_client(settings: Settings) -> AsyncOpenAI:
+    """
+    Client for the embeddings and chat completions, meant to be shared by the whole process
+    so that its HTTP connections are kept alive between requests.
+    """
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        timeout=httpx.Timeout(
+            settings.OPENAI_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT
+        ),
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        http_client=DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY,
+            )
+        ),
+    )
+
+
+def sanitize_query(query: str) -> str:
+    text = re.sub(r'[^\w\s\-.,!?()[\]{}:;"\'@#$%^&*+=<>/\\|`~]', " ", query)
+    # Normalize whitespace
+    return " ".join(text.split())
+
+
+# Chunks of the searched projects, all the chunks of the organization are searched without it
+PROJECT_FILTER_CLAUSE = "AND w.project_id = ANY(%(project_ids)s::UUID[])"
+# Containment is answered by the GIN index of the documents metadata
+METADATA_FILTER_CLAUSE = "AND w.metadata @> %(metadata_filter)s"
+
+
+def filter_key(metadata_filter: dict | None) -> str | None:
+    """Hashable form of a metadata filter, for the cache keys"""
+    return json.dumps(metadata_filter, sort_keys=True) if metadata_filter else None
+
+
+def reciprocal_rank_fusion(
+    rankings: list[tuple[List[DocumentSearchResult], float]], k: int, limit: int
+) -> List[DocumentSearchResult]:
+    """
+    Merges weighted rankings: a chunk scores the sum of `weight / (k + rank)` over the rankings
+    it appears in, so chunks ranked well by several of them come first.
+    """
+    scores: dict[tuple, float] = {}
+    chunks: dict[tuple, DocumentSearchResult] = {}
+    for results, weight in rankings:
+        for rank, result in enumerate(results, start=1):
+            key = (result.id, result.chunk)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+            chunks.setdefault(key, result)
+    best = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [replace(chunks[key], score=scores[key]) for key in best]
+
+
+def clamp_ef_search(ef_search: int) -> int:
+    """pgvector rejects hnsw.ef_search values outside of its bounds"""
+    return min(max(ef_search, MIN_EF_SEARCH), MAX_EF_SEARCH)
+
+
+def rag_messages(
+    query: str, system_prompt: str, relevant_chunks: List[DocumentSearchResult]
+) -> list[dict]:
+    context = "\n\n".join(
+        f"Document {json.dumps(chunk.metadata)}:\n{chunk.text}"
+        for chunk in relevant_chunks
+    )
+    prompt = f"""Question: {query}
+
+        Please use the following context from the documents to provide an accurate response:
+
+        {context}
+
+        Answer:"""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt},
+    ]
+
+
+class SearchStrategy(str, Enum):
+    EXACT = "exact"  # scan of the project's chunks only
+    INDEX = "index"  # vector index, filtered afterwards
+    ITERATIVE = "iterative"  # vector index, scanned until enough chunks pass the filter
+
+
+async def get_project_data_version(conn, project_ids: list[str] | None) -> int:
+    """
+    Version of the searchable chunks of projects (or of the whole organization when None),
+    bumped by triggers whenever they change. Summed over the projects, it grows with any of them.
+    """
+    async with conn.cursor() as cur:
+        await cur.execute(
+            f"""
+            SELECT COALESCE(SUM(version), 0)::BIGINT
+            FROM {TableNames.reserved_project_data_version_table_name}
+            WHERE %(project_ids)s::UUID[] IS NULL OR project_id = ANY(%(project_ids)s::UUID[]);
+            """,
+            {"project_ids": project_ids},
+        )
+        return (await cur.fetchone())[0]
+
+
 class PGAIClient:
-    def __init__(self, config: Settings = Settings()):
+    def __init__(
+        self,
+        config: Settings = Settings(),
+        database: Database = db,
+        openai_client: AsyncOpenAI | None = None,
+        embedding_cache: EmbeddingCache | None = None,
+        search_cache: TTLCache | None = None,
+    ):
         self.config = config
+        self.db = database
+        self.openai = openai_client or create_openai_client(config)
+        self.embedding_cache = (
+            embedding_cache
+            if embedding_cache is not None
+            else EmbeddingCache(max_bytes=0)
+        )
+        # Search results, keyed by the data version of the project they were computed at
+        self.search_cache = (
+            search_cache if search_cache is not None else TTLCache(max_size=0, ttl=0)
+        )
+        # Whether the organization is indexed and the (bounded) number of chunks of the project
+        self.project_sizes = TTLCache(
+            max_size=10000, ttl=self.config.VECTOR_SEARCH_PROJECT_SIZE_TTL
+        )
+        self._pgvector_version: tuple[int, ...] | None = None
+
+    async def close(self):
+        await self.openai.close()
+        await self.embedding_cache.close()
+
+    def embedding_key(self, query: str) -> str:
+        return EmbeddingCache.key(
+            self.config.OPENAI_EMBEDDING_MODEL,
+            self.config.OPENAI_EMBEDDING_DIMENSIONS,
+            query,
+        )
+
+    async def embed_query(self, query: str) -> np.ndarray:
+        """Embedding of a sanitized query, from the cache when it was already embedded"""
+        return (await self.embed_queries([query]))[0]
+
+    async def embed_queries(self, queries: list[str]) -> list[np.ndarray]:
+        """Embeddings of sanitized queries, the ones not cached are embedded in a single request"""
+        embeddings = {}
+        for query in queries:
+            if query not in embeddings:
+                embeddings[query] = await self.embedding_cache.get(
+                    self.embedding_key(query)
+                )
+        missing = [
+            query for query, embedding in embeddings.items() if embedding is None
+        ]
+        if missing:
+            response = await self.openai.embeddings.create(
+                model=self.config.OPENAI_EMBEDDING_MODEL,
+                input=missing,
+                encoding_format="float",
+            )
+            for data in response.data:
+                query = missing[data.index]
+                embeddings[query] = np.array(data.embedding, dtype=np.float32)
+                await self.embedding_cache.set(
+                    self.embedding_key(query), embeddings[query]
+                )
+        return [embeddings[query] for query in queries]
 
     async def find_relevant_chunks(
-        self, query: str, limit: int, organization_id: str, project_id: str
+        self,
+        query: str,
+        limit: int,
+        organization_id: str,
+        project_id: str | None,
+        ef_search: int | None = None,
+        mode: SearchMode = "vector",
+        vector_weight: float | None = None,
+        text_weight: float | None = None,
+        metadata_filter: dict | None = None,
+        project_ids: list[str] | None = None,
+        embedding: np.ndarray | None = None,
     ) -> List[DocumentSearchResult]:
         """
         Find the most relevant document chunks for a given query using vector similarity search.
+        `ef_search` trades speed for recall when the organization has a vector index.
+        The hybrid mode also runs a full-text search and fuses both rankings.
+        `metadata_filter` restricts the search to the documents whose metadata contains it.
+        Searches `project_id`, else the `project_ids`, else the whole organization, in one query.
+        The query is embedded unless its `embedding` is given.
         """
-        text = re.sub(r'[^\w\s\-.,!?()[\]{}:;"\'@#$%^&*+=<>/\\|`~]', " ", query)
-        # Normalize whitespace
-        sanitized_query = " ".join(text.split())
+        sanitized_query = sanitize_query(query)
+        metadata_filter = metadata_filter or None
+        if project_id is not None:
+            project_ids = [project_id]
+        if project_ids is not None:
+            project_ids = sorted({str(uuid.UUID(str(p))) for p in project_ids})
 
-        client = AsyncOpenAI(
-            api_key=self.config.OPENAI_API_KEY, base_url=self.config.OPENAI_BASE_URL
+        # The index returns at most ef_search rows
+        ef_search = max(ef_search or self.config.VECTOR_INDEX_EF_SEARCH, limit)
+        if vector_weight is None:
+            vector_weight = self.config.SEARCH_HYBRID_VECTOR_WEIGHT
+        if text_weight is None:
+            text_weight = self.config.SEARCH_HYBRID_TEXT_WEIGHT
+        cache_key = (
+            str(organization_id),
+            tuple(project_ids) if project_ids is not None else None,
+            self.embedding_key(sanitized_query),
+            limit,
+            ef_search,
+            mode,
+            (vector_weight, text_weight) if mode == "hybrid" else None,
+            filter_key(metadata_filter),
         )
-        response = await client.embeddings.create(
-            model=self.config.OPENAI_EMBEDDING_MODEL,
-            input=sanitized_query,
-            encoding_format="float",
+        if self.search_cache.enabled:
+            async with self.db.tenant_connection(
+                organization_id, read_only=True
+            ) as conn:
+                version = await get_project_data_version(conn, project_ids)
+            results = self.search_cache.get((*cache_key, version))
+            if results is not MISSING:
+                return results
+
+        if embedding is None:
+            embedding = await self.embed_query(sanitized_query)
+
+        async def search(retrieve) -> tuple[int, List[DocumentSearchResult]]:
+            async with self.db.tenant_connection(
+                organization_id, read_only=True
+            ) as conn:
+                version = 0
+                if self.search_cache.enabled:
+                    # Read again on the connection searching, which might be another replica.
+                    # Read before searching, the results are at least as recent as the version
+                    version = await get_project_data_version(conn, project_ids)
+                return version, await retrieve(conn)
+
+        async def vector(conn, limit: int, ef_search: int):
+            strategy = await self.choose_strategy(
+                conn, organization_id, project_ids, metadata_filter
+            )
+            return await self.vector_search(
+                conn,
+                embedding,
+                project_ids,
+                limit,
+                ef_search,
+                strategy,
+                metadata_filter,
+            )
+
+        if mode == "hybrid":
+            candidates = max(limit, self.config.SEARCH_HYBRID_CANDIDATES)
+            (
+                (vector_version, vector_results),
+                (text_version, text_results),
+            ) = await asyncio.gather(
+                search(
+                    lambda conn: vector(conn, candidates, max(ef_search, candidates))
+                ),
+                search(
+                    lambda conn: self.text_search(
+                        conn,
+                        sanitized_query,
+                        embedding,
+                        project_ids,
+                        candidates,
+                        metadata_filter,
+                    )
+                ),
+            )
+            version = min(vector_version, text_version)
+            results = reciprocal_rank_fusion(
+                [(vector_results, vector_weight), (text_results, text_weight)],
+                k=self.config.SEARCH_RRF_K,
+                limit=limit,
+            )
+        else:
+            version, results = await search(lambda conn: vector(conn, limit, ef_search))
+        if self.search_cache.enabled:
+            self.search_cache.set((*cache_key, version), results)
+        return results
+
+    async def find_relevant_chunks_batch(
+        self,
+        queries: list[str],
+        limit: int,
+        organization_id: str,
+        project_id: str,
+        ef_search: int | None = None,
+        mode: SearchMode = "vector",
+        vector_weight: float | None = None,
+        text_weight: float | None = None,
+        metadata_filter: dict | None = None,
+    ) -> list[List[DocumentSearchResult]]:
+        """
+        Same as `find_relevant_chunks` for several queries, embedded in a single request.
+        At most SEARCH_BATCH_CONCURRENCY queries are searched at the same time.
+        """
+        embeddings = await self.embed_queries([sanitize_query(q) for q in queries])
+        semaphore = asyncio.Semaphore(self.config.SEARCH_BATCH_CONCURRENCY)
+
+        async def search(query: str, embedding: np.ndarray):
+            async with semaphore:
+                return await self.find_relevant_chunks(
+                    query,
+                    limit,
+                    organization_id,
+                    project_id,
+                    ef_search,
+                    mode,
+                    vector_weight,
+                    text_weight,
+                    metadata_filter,
+                    embedding=embedding,
+                )
+
+        return await asyncio.gather(
+            *(search(query, embedding) for query, embedding in zip(queries, embeddings))
         )
 
-        embedding = np.array(response.data[0].embedding)
+    async def get_pgvector_version(self, conn) -> tuple[int, ...]:
+        if self._pgvector_version is None:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT extversion FROM pg_extension WHERE extname = 'vector';"
+                )
+                row = await cur.fetchone()
+            self._pgvector_version = (
+                tuple(int(part) for part in re.findall(r"\d+", row[0])) if row else (0,)
+            )
+        return self._pgvector_version
 
-        await db.connect()
-        # Query the database for the most similar chunks using pgvector's cosine distance operator (<=>)
-        async with db.connection() as conn:
-            async with conn.cursor(row_factory=class_row(DocumentSearchResult)) as cur:
+    async def choose_strategy(
+        self,
+        conn,
+        organization_id: str,
+        project_ids: list[str] | None,
+        metadata_filter: dict | None = None,
+    ) -> SearchStrategy:
+        """
+        The vector index ranks the chunks of the whole organization, the project filter is applied
+        afterwards: it would miss the chunks of small projects, which are cheap to scan exactly.
+        Large projects go through the index, scanned iteratively when pgvector supports it.
+        Several projects, the whole organization and metadata filters are sized the same way.
+        """
+        threshold = self.config.VECTOR_SEARCH_EXACT_THRESHOLD
+        key = (
+            str(organization_id),
+            tuple(project_ids) if project_ids is not None else None,
+            filter_key(metadata_filter),
+        )
+        size = self.project_sizes.get(key)
+        if size is MISSING:
+            async with conn.cursor() as cur:
                 await cur.execute(
                     f"""
-                        SELECT w.id, w.project_id, w.title, w.metadata, w.text, w.chunk, w.embedding <=> %s as distance
-                            FROM "{organization_id}".{TableNames.reserved_pgai_table_name}_embedding w
-                            WHERE w.project_id = %s
-                            AND w.deleted_at IS NULL
-                            ORDER BY distance
-                            LIMIT %s
+                    SELECT
+                        (SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%(index)s)),
+                        (SELECT COUNT(*) FROM (
+                            SELECT 1 FROM {TableNames.reserved_pgai_table_name}_embedding w
+                            WHERE w.deleted_at IS NULL
+                            {PROJECT_FILTER_CLAUSE if project_ids is not None else ""}
+                            {METADATA_FILTER_CLAUSE if metadata_filter else ""}
+                            LIMIT %(limit)s
+                        ) s);
                     """,
-                    (embedding, project_id, limit),
+                    {
+                        "index": VECTOR_INDEX_NAME,
+                        "project_ids": project_ids,
+                        "metadata_filter": Jsonb(metadata_filter),
+                        "limit": threshold,
+                    },
                 )
-                results = await cur.fetchall()
-                return results
+                size = await cur.fetchone()
+            self.project_sizes.set(key, size)
+        indexed, chunks = size
+        if not indexed or chunks < threshold:
+            return SearchStrategy.EXACT
+        if await self.get_pgvector_version(conn) >= (0, 8):
+            return SearchStrategy.ITERATIVE
+        return SearchStrategy.INDEX
+
+    async def vector_search(
+        self,
+        conn,
+        embedding: np.ndarray,
+        project_ids: list[str] | None,
+        limit: int,
+        ef_search: int,
+        strategy: SearchStrategy,
+        metadata_filter: dict | None = None,
+    ) -> List[DocumentSearchResult]:
+        query = f"""
+            SELECT w.id, w.project_id, w.title, w.metadata, w.text, w.chunk, w.embedding <=> %(embedding)s AS distance
+                FROM {TableNames.reserved_pgai_table_name}_embedding w
+                WHERE w.deleted_at IS NULL
+                {PROJECT_FILTER_CLAUSE if project_ids is not None else ""}
+                {METADATA_FILTER_CLAUSE if metadata_filter else ""}
+        """
+        if strategy is SearchStrategy.INDEX and limit > MAX_EF_SEARCH:
+            # The index returns at most ef_search rows, it can't return that many
+            strategy = SearchStrategy.EXACT
+        ef_search = clamp_ef_search(ef_search)
+        if strategy is SearchStrategy.EXACT:
+            # Ordering by an expression keeps the planner from going through the vector index
+            query += "ORDER BY (w.embedding <=> %(embedding)s) + 0 LIMIT %(limit)s"
+        elif strategy is SearchStrategy.ITERATIVE:
+            await conn.execute(
+                """
+                SELECT set_config('hnsw.ef_search', %s, true),
+                    set_config('hnsw.iterative_scan', 'relaxed_order', true),
+                    set_config('hnsw.max_scan_tuples', %s, true);
+                """,
+                (str(ef_search), str(self.config.VECTOR_SEARCH_MAX_SCAN_TUPLES)),
+            )
+            # Relaxed order scans return almost sorted chunks, sorted again here
+            query = f"""
+                WITH nearest AS MATERIALIZED ({query} ORDER BY distance LIMIT %(limit)s)
+                SELECT * FROM nearest ORDER BY distance
+            """
+        else:
+            await conn.execute(
+                "SELECT set_config('hnsw.ef_search', %s, true);", (str(ef_search),)
+            )
+            query += "ORDER BY distance LIMIT %(limit)s"
+        async with conn.cursor(row_factory=class_row(DocumentSearchResult)) as cur:
+            await cur.execute(
+                query,
+                {
+                    "embedding": embedding,
+                    "project_ids": project_ids,
+                    "metadata_filter": Jsonb(metadata_filter),
+                    "limit": limit,
+                },
+            )
+            return await cur.fetchall()
+
+    async def text_search(
+        self,
+        conn,
+        query: str,
+        embedding: np.ndarray,
+        project_ids: list[str] | None,
+        limit: int,
+        metadata_filter: dict | None = None,
+    ) -> List[DocumentSearchResult]:
+        """Chunks containing the words of the query, ranked by full-text relevance"""
+        async with conn.cursor(row_factory=class_row(DocumentSearchResult)) as cur:
+            await cur.execute(
+                f"""
+                    SELECT w.id, w.project_id, w.title, w.metadata, w.text, w.chunk, w.embedding <=> %(embedding)s AS distance
+                        FROM {TableNames.reserved_pgai_table_name}_embedding w,
+                            websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', %(query)s) q
+                        WHERE w.deleted_at IS NULL
+                        {PROJECT_FILTER_CLAUSE if project_ids is not None else ""}
+                        AND to_tsvector('{TEXT_SEARCH_CONFIG}', w.chunk) @@ q
+                        {METADATA_FILTER_CLAUSE if metadata_filter else ""}
+                        ORDER BY ts_rank_cd(to_tsvector('{TEXT_SEARCH_CONFIG}', w.chunk), q) DESC
+                        LIMIT %(limit)s
+                """,
+                {
+                    "embedding": embedding,
+                    "query": query,
+                    "project_ids": project_ids,
+                    "metadata_filter": Jsonb(metadata_filter),
+                    "limit": limit,
+                },
+            )
+            return await cur.fetchall()
 
     async def rag_query(
-        self, query, system_prompt: str, limit, organization_id: str, project_id: str
+        self,
+        query,
+        system_prompt: str,
+        limit,
+        organization_id: str,
+        project_id: str,
+        ef_search: int | None = None,
+        mode: SearchMode = "vector",
+        vector_weight: float | None = None,
+        text_weight: float | None = None,
+        metadata_filter: dict | None = None,
     ):
         """
         Perform RAG (Retrieval-Augmented Generation) using your documents.
         """
 
         relevant_chunks = await self.find_relevant_chunks(
-            query, limit, organization_id, project_id
+            query,
+            limit,
+            organization_id,
+            project_id,
+            ef_search,
+            mode,
+            vector_weight,
+            text_weight,
+            metadata_filter,
         )
 
-        context = "\n\n".join(
-            f"Document {json.dumps(chunk.metadata)}:\n{chunk.text}"
-            for chunk in relevant_chunks
+        response = await self.openai.chat.completions.create(
+            model=self.config.OPENAI_MODEL,
+            messages=rag_messages(query, system_prompt, relevant_chunks),
         )
-        prompt = f"""Question: {query}
-
-        Please use the following context from the documents to provide an accurate response:
 
-        {context}
+        return response.choices[0].message.content
 
-        Answer:"""
-        client = AsyncOpenAI(
-            api_key=config.OPENAI_API_KEY, base_url=config.OPENAI_BASE_URL
-        )
-        response = await client.chat.completions.create(
-            model=config.OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
+    async def rag_stream(
+        self,
+        query: str,
+        system_prompt: str,
+        relevant_chunks: List[DocumentSearchResult],
+    ) -> AsyncIterator[str]:
+        """
+        Answer to the query from already retrieved chunks, yielded as the LLM generates it.
+        Closing the generator (e.g. when the client disconnects) closes the LLM request.
+        """
+        stream = await self.openai.chat.completions.create(
+            model=self.config.OPENAI_MODEL,
+            messages=rag_messages(query, system_prompt, relevant_chunks),
+            stream=True,
         )
-
-        return response.choices[0].message.content
+        async with stream:
+            async for chunk in stream:
+                # Reasoning models send deltas without content while thinking
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
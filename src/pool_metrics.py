@@ -0,0 +1,149 @@
+import time
+from bisect import bisect_left
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+
+# Upper bounds of the histogram buckets, in seconds
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_VERBS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+class Histogram:
+    """Cumulative histogram of durations, rendered in the Prometheus text format"""
+
+    def __init__(self, buckets: tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> list[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip([*self.buckets, "+Inf"], self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class PoolMetrics:
+    """Checkout wait, timeouts and usage of a connection pool"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkout_wait = Histogram()
+        self.timeouts = 0
+        self.in_use = 0
+        # Reset by `pop_window`, used to resize the pool
+        self.window_wait = 0.0
+        self.window_checkouts = 0
+        self.window_timeouts = 0
+        self.window_peak_in_use = 0
+
+    def checked_out(self, wait: float):
+        self.checkout_wait.observe(wait)
+        self.in_use += 1
+        self.window_wait += wait
+        self.window_checkouts += 1
+        self.window_peak_in_use = max(self.window_peak_in_use, self.in_use)
+
+    def checked_in(self):
+        self.in_use -= 1
+
+    def timed_out(self):
+        self.timeouts += 1
+        self.window_timeouts += 1
+
+    def pop_window(self) -> tuple[float, int, int]:
+        """Average checkout wait, timeouts and peak usage since the previous call"""
+        average_wait = (
+            self.window_wait / self.window_checkouts if self.window_checkouts else 0.0
+        )
+        window = (average_wait, self.window_timeouts, self.window_peak_in_use)
+        self.window_wait = 0.0
+        self.window_checkouts = 0
+        self.window_timeouts = 0
+        self.window_peak_in_use = self.in_use
+        return window
+
+
+class QueryMetrics:
+    """Duration of the queries, by statement type"""
+
+    def __init__(self):
+        self.durations: dict[str, Histogram] = {}
+
+    def observe(self, query, duration: float):
+        text = query if isinstance(query, str) else ""
+        words = text.lstrip().split(None, 1)
+        verb = words[0].upper() if words else ""
+        verb = verb if verb in QUERY_VERBS else "OTHER"
+        if verb not in self.durations:
+            self.durations[verb] = Histogram()
+        self.durations[verb].observe(duration)
+
+
+query_metrics = QueryMetrics()
+
+
+class TimedAsyncCursor(psycopg.AsyncCursor):
+    """Cursor recording the duration of every query in `query_metrics`"""
+
+    async def execute(self, query, params=None, **kwargs):
+        start = time.monotonic()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            query_metrics.observe(query, time.monotonic() - start)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        start = time.monotonic()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            query_metrics.observe(query, time.monotonic() - start)
+
+
+def render_metrics(pools: list[tuple[AsyncConnectionPool, PoolMetrics]]) -> str:
+    """Renders the pool and query metrics in the Prometheus text format"""
+    samples = {
+        "db_pool_size": ("gauge", lambda pool, stats, m: stats.get("pool_size", 0)),
+        "db_pool_min_size": ("gauge", lambda pool, stats, m: pool.min_size),
+        "db_pool_max_size": ("gauge", lambda pool, stats, m: pool.max_size),
+        "db_pool_in_use": ("gauge", lambda pool, stats, m: m.in_use),
+        "db_pool_idle": (
+            "gauge",
+            lambda pool, stats, m: stats.get("pool_available", 0),
+        ),
+        "db_pool_requests_waiting": (
+            "gauge",
+            lambda pool, stats, m: stats.get("requests_waiting", 0),
+        ),
+        "db_pool_checkout_timeouts_total": (
+            "counter",
+            lambda pool, stats, m: m.timeouts,
+        ),
+    }
+    pools_stats = [(pool, pool.get_stats(), metrics) for pool, metrics in pools]
+    lines = []
+    for name, (metric_type, value) in samples.items():
+        lines.append(f"# TYPE {name} {metric_type}")
+        for pool, stats, metrics in pools_stats:
+            lines.append(
+                f'{name}{{pool="{metrics.name}"}} {value(pool, stats, metrics)}'
+            )
+    lines.append("# TYPE db_pool_checkout_wait_seconds histogram")
+    for _, metrics in pools:
+        lines += metrics.checkout_wait.render(
+            "db_pool_checkout_wait_seconds", f'pool="{metrics.name}"'
+        )
+    lines.append("# TYPE db_query_duration_seconds histogram")
+    for verb, histogram in sorted(query_metrics.durations.items()):
+        lines += histogram.render("db_query_duration_seconds", f'statement="{verb}"')
+    return "\n".join(lines) + "\n"
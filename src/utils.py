@@ -1,5 +1,6 @@
 from src.configuration import config
 from src.constant import TableNames
+from src.migrations import apply_org_migrations
 from src.models.document import DocumentStatus
 
 
@@ -97,3 +98,6 @@ async def create_org_schema(cur, org_id: str):
             FOR EACH ROW
             EXECUTE FUNCTION update_embedding_status_{org_id_safe}();
         """)
+
+    # Apply the schema migrations (additional tables and indexes)
+    await apply_org_migrations(cur, org_id)
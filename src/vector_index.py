@@ -0,0 +1,211 @@
+import psycopg
+from loguru import logger
+from src.configuration import Settings
+from src.constant import TableNames
+from src.models.system import VectorIndexStatus
+
+VECTOR_INDEX_NAME = "pgai_embedding_store_hnsw_idx"
+# Key of the advisory locks taken while building, combined with the organization
+VECTOR_INDEX_LOCK_KEY = 726184930
+# Bounds of hnsw.ef_search accepted by pgvector
+MIN_EF_SEARCH = 1
+MAX_EF_SEARCH = 1000
+
+
+def embedding_store(org_id: str) -> str:
+    return f'"{org_id}".{TableNames.reserved_pgai_table_name}_embedding_store'
+
+
+async def get_vector_index_status(
+    conn, org_id: str, settings: Settings
+) -> VectorIndexStatus:
+    """Current state of the vector index of an organization, including an ongoing build"""
+    async with conn.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT i.indisvalid, pg_relation_size(i.indexrelid), c.reloptions
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indexrelid = to_regclass(%s);
+            """,
+            (f'"{org_id}".{VECTOR_INDEX_NAME}',),
+        )
+        index = await cur.fetchone()
+        await cur.execute(
+            """
+            SELECT p.phase, p.tuples_done, p.tuples_total
+            FROM pg_stat_progress_create_index p
+            WHERE p.relid = to_regclass(%s);
+            """,
+            (embedding_store(org_id),),
+        )
+        progress = await cur.fetchone()
+        await cur.execute(
+            "SELECT reltuples::BIGINT FROM pg_class WHERE oid = to_regclass(%s);",
+            (embedding_store(org_id),),
+        )
+        estimate = await cur.fetchone()
+        await cur.execute(
+            """
+            SELECT rebuild_requested_at, build_started_at, built_at, error
+            FROM vector_indexes
+            WHERE org_id = %s;
+            """,
+            (org_id,),
+        )
+        state = await cur.fetchone() or (None, None, None, None)
+
+    return VectorIndexStatus(
+        organization_id=org_id,
+        index_exists=index is not None,
+        valid=bool(index and index[0]),
+        building=progress is not None,
+        phase=progress[0] if progress else None,
+        progress=progress[1] / progress[2] if progress and progress[2] else None,
+        size_bytes=index[1] if index else None,
+        parameters=dict(option.split("=", 1) for option in index[2] or [])
+        if index
+        else None,
+        # Negative until the table is first analyzed
+        estimated_chunks=estimate[0] if estimate and estimate[0] >= 0 else None,
+        threshold=settings.VECTOR_INDEX_THRESHOLD,
+        rebuild_requested_at=state[0],
+        build_started_at=state[1],
+        built_at=state[2],
+        error=state[3],
+    )
+
+
+async def build_vector_index(conn, org_id: str, settings: Settings):
+    """
+    Builds the HNSW index of an organization's embeddings, or rebuilds it with the current
+    parameters. The index is built concurrently, searches keep using the previous one (or
+    an exact scan) until it is ready. Expects an autocommit connection.
+    """
+    table = embedding_store(org_id)
+    await conn.execute(
+        """
+        INSERT INTO vector_indexes (org_id, build_started_at) VALUES (%s, NOW())
+        ON CONFLICT (org_id) DO UPDATE SET build_started_at = NOW(), error = NULL;
+        """,
+        (org_id,),
+    )
+    try:
+        await conn.execute(
+            "SELECT set_config('maintenance_work_mem', %s, false);",
+            (settings.VECTOR_INDEX_MAINTENANCE_WORK_MEM,),
+        )
+        # Left behind by a failed build
+        await conn.execute(
+            f'DROP INDEX CONCURRENTLY IF EXISTS "{org_id}".{VECTOR_INDEX_NAME}_new;'
+        )
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s);",
+                (f'"{org_id}".{VECTOR_INDEX_NAME}',),
+            )
+            existing = await cur.fetchone()
+        if existing and not existing[0]:
+            await conn.execute(
+                f'DROP INDEX CONCURRENTLY "{org_id}".{VECTOR_INDEX_NAME};'
+            )
+            existing = None
+        name = f"{VECTOR_INDEX_NAME}_new" if existing else VECTOR_INDEX_NAME
+        logger.info(f"Building the vector index of organization {org_id}")
+        await conn.execute(f"""
+            CREATE INDEX CONCURRENTLY {name} ON {table}
+            USING hnsw (embedding vector_cosine_ops)
+            WITH (m = {int(settings.VECTOR_INDEX_M)}, ef_construction = {int(settings.VECTOR_INDEX_EF_CONSTRUCTION)});
+        """)
+        if existing:
+            await conn.execute(
+                f'DROP INDEX CONCURRENTLY "{org_id}".{VECTOR_INDEX_NAME};'
+            )
+            await conn.execute(
+                f'ALTER INDEX "{org_id}".{name} RENAME TO {VECTOR_INDEX_NAME};'
+            )
+    except Exception as e:
+        await conn.execute(
+            "UPDATE vector_indexes SET build_started_at = NULL, error = %s WHERE org_id = %s;",
+            (str(e), org_id),
+        )
+        raise
+    # A rebuild requested during the build is kept for the next run
+    await conn.execute(
+        """
+        UPDATE vector_indexes
+        SET built_at = NOW(),
+            rebuild_requested_at = CASE WHEN rebuild_requested_at <= build_started_at
+                THEN NULL ELSE rebuild_requested_at END,
+            build_started_at = NULL
+        WHERE org_id = %s;
+        """,
+        (org_id,),
+    )
+    logger.info(f"Vector index of organization {org_id} is ready")
+
+
+async def needs_vector_index(conn, org_id: str, settings: Settings) -> bool:
+    """Whether a rebuild was requested, or the chunks outgrew the threshold without an index"""
+    async with conn.cursor() as cur:
+        await cur.execute(
+            "SELECT rebuild_requested_at IS NOT NULL FROM vector_indexes WHERE org_id = %s;",
+            (org_id,),
+        )
+        requested = await cur.fetchone()
+        if requested and requested[0]:
+            return True
+        if settings.VECTOR_INDEX_THRESHOLD <= 0:
+            return False
+        await cur.execute(
+            """
+            SELECT to_regclass(%s) IS NOT NULL,
+                (SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s));
+            """,
+            (embedding_store(org_id), f'"{org_id}".{VECTOR_INDEX_NAME}'),
+        )
+        store_exists, index_valid = await cur.fetchone()
+        if not store_exists or index_valid:
+            return False
+        # Bounded count, the stores of small organizations are cheap to scan
+        await cur.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM {embedding_store(org_id)} LIMIT %s) s;",
+            (settings.VECTOR_INDEX_THRESHOLD,),
+        )
+        return (await cur.fetchone())[0] >= settings.VECTOR_INDEX_THRESHOLD
+
+
+async def ensure_vector_indexes(settings: Settings):
+    """
+    Builds the vector indexes that are missing or were asked to be rebuilt.
+    Uses a dedicated session (advisory locks, CREATE INDEX CONCURRENTLY).
+    """
+    async with await psycopg.AsyncConnection.connect(
+        settings.DB_SESSION_URL, autocommit=True
+    ) as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT id FROM organizations;")
+            org_ids = [str(row[0]) for row in await cur.fetchall()]
+        for org_id in org_ids:
+            try:
+                if not await needs_vector_index(conn, org_id, settings):
+                    continue
+                async with conn.cursor() as cur:
+                    # Another worker might already be building it
+                    await cur.execute(
+                        "SELECT pg_try_advisory_lock(%s, hashtext(%s));",
+                        (VECTOR_INDEX_LOCK_KEY, org_id),
+                    )
+                    if not (await cur.fetchone())[0]:
+                        continue
+                try:
+                    await build_vector_index(conn, org_id, settings)
+                finally:
+                    await conn.execute(
+                        "SELECT pg_advisory_unlock(%s, hashtext(%s));",
+                        (VECTOR_INDEX_LOCK_KEY, org_id),
+                    )
+            except Exception as e:
+                logger.error(
+                    f"Error building the vector index of organization {org_id}: {e}"
+                )
@@ -3,6 +3,17 @@ from arq import cron
 from arq.worker import create_worker
 from pgai.vectorizer import Worker
 from src.configuration import config as settings
+from src.database import db
+
+
+async def startup(ctx):
+    """Open the shared pool once for all the jobs of the worker"""
+    await db.connect(settings)
+    await db.ensure_pgai_installed()
+
+
+async def shutdown(ctx):
+    await db.disconnect()
 
 
 class WorkerSettings:
@@ -14,15 +25,25 @@ class WorkerSettings:
             max_tries=2,
             timeout=600,
         ),
+        cron(
+            "src.worker_runner.vector_index_runner",
+            minute={m for m in range(0, 60, 5)},
+            run_at_startup=True,
+            max_tries=1,
+            # Index builds of large organizations take a while
+            timeout=6 * 3600,
+        ),
     ]
     redis_settings = settings.REDIS_ARQ_SETTINGS
     max_jobs = settings.REDIS_ARQ_MAX_JOBS
+    on_startup = startup
+    on_shutdown = shutdown
 
 
 async def main():
     """Run both arq worker and pgai worker concurrently"""
     arq_worker = create_worker(WorkerSettings)
-    pgai_worker = Worker(db_url=settings.DB_URL)
+    pgai_worker = Worker(db_url=settings.DB_SESSION_URL)
     await asyncio.gather(
         # arq worker (handles parsing)
         arq_worker.main(),
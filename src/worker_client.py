@@ -1,10 +1,18 @@
 import json
 import sys
 import asyncio
+import uuid
 
 from fastapi import HTTPException
 
-from src.models.pagination import PaginationResponse
+from src.models.pagination import (
+    DOCUMENT_CURSOR_KEY,
+    PROJECT_CURSOR_KEY,
+    CountMode,
+    PaginationResponse,
+    decode_cursor,
+    encode_cursor,
+)
 from src.models.project import ProjectInfo
 from src.models.system import StatInfo, SystemResponse
 
@@ -15,32 +23,196 @@ if sys.platform == "win32":
 from loguru import logger
 import pickle
 import base64
-from src.database import db
+from psycopg import AsyncConnection
+from psycopg.errors import InvalidTextRepresentation, UndefinedTable
+from src.access_cache import AccessCache
+from src.cache import MISSING
+from src.database import Database, db, set_tenant
 from src.constant import TableNames
-from src.models.document import DocumentDetail, DocumentInfo, DocumentStatus
+from src.models.document import (
+    DocumentDetail,
+    DocumentInfo,
+    DocumentPage,
+    DocumentPagesResponse,
+    DocumentStatus,
+)
+
+# Columns needed to build each selectable response field
+DOCUMENT_INFO_COLUMNS = {
+    "document_id": ["d.id AS document_id"],
+    "document_uploaded_name": ["d.document_uploaded_name"],
+    "metadata": ["d.metadata"],
+    "status": ["d.status"],
+    "uploaded_by_user_name": [
+        "(SELECT username FROM users u WHERE u.id = d.uploaded_by_user_id) as uploaded_by_user_name"
+    ],
+    "created_at": ["d.created_at"],
+    "project_id": ["d.project_id"],
+    "project_name": ["p.name as project_name"],
+    "organization_id": [],
+}
+DOCUMENT_DETAIL_COLUMNS = {
+    "document_id": ["d.id"],
+    "document_name": ["d.document_uploaded_name"],
+    "document_type": ["d.document_uploaded_name"],
+    "metadata": ["d.metadata"],
+    "document_status": ["d.status"],
+    "created_at": ["d.created_at"],
+    "updated_at": [],
+    "parsed_markdown_text": ["d.parsed_document"],
+    "file_bytes": ["d.document_bytes"],
+    "summary": ["d.summary"],
+    "uploaded_by_user_name": [
+        "(SELECT username FROM users u WHERE u.id = d.uploaded_by_user_id) as uploaded_by_user_name"
+    ],
+}
+PROJECT_INFO_COLUMNS = {
+    "project_id": ["p.id::text as project_id"],
+    "project_name": ["p.name as project_name"],
+    "number_of_documents": ["dc.number_of_documents"],
+    "description": ["COALESCE(p.description, '') as description"],
+    "created_at": ["p.created_at"],
+}
+
+
+def select_fields(
+    fields: list[str] | None, available_columns: dict, required: list[str]
+) -> tuple[list[str], str]:
+    """
+    Resolve the requested fields against the available ones.
+    Returns the selected fields (in the response order) and the SQL select list they need.
+    """
+    if fields is None:
+        selected = list(available_columns)
+    else:
+        unknown = set(fields) - set(available_columns)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}. "
+                f"Available fields: {', '.join(available_columns)}",
+            )
+        selected = [
+            field for field in available_columns if field in fields or field in required
+        ]
+    columns = []
+    for field in selected:
+        for column in available_columns[field]:
+            if column not in columns:
+                columns.append(column)
+    return selected, ",\n".join(columns)
+
+
+async def count_rows(cur, from_clause: str, params: tuple, count: CountMode):
+    """
+    Counts the rows matched by a FROM/WHERE clause.
+    `estimated` uses the planner's row estimate instead of scanning the rows.
+    """
+    if count == "none":
+        return None
+    if count == "estimated":
+        await cur.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 {from_clause}", params)
+        plan = (await cur.fetchone())[0]
+        return int(plan[0]["Plan"]["Plan Rows"])
+    await cur.execute(f"SELECT COUNT(*) {from_clause}", params)
+    return (await cur.fetchone())[0]
+
+
+def fused_access_condition(
+    organization_id: str,
+    user_id: str | None,
+    roles_allowed: list | None,
+    token_roles: dict[str, str] | None = None,
+) -> tuple[str, tuple]:
+    """
+    SQL condition restricting a query to users having one of the allowed roles in the organization.
+    Used to fuse the access check with the query itself. No condition if user_id is None,
+    or if the role comes from the access token.
+    """
+    if user_id is None:
+        return "", ()
+    no_access = HTTPException(
+        status_code=404,
+        detail="Organization does not exist or user does not have access.",
+    )
+    try:
+        uuid.UUID(str(organization_id))  # the organization id is part of the query
+    except ValueError:
+        raise no_access
+    if token_roles and str(organization_id) in token_roles:
+        if token_roles[str(organization_id)] not in roles_allowed:
+            raise no_access
+        return "", ()
+    return (
+        """AND EXISTS (
+                SELECT 1 FROM user_org uo
+                WHERE uo.user_id = %s
+                AND uo.org_id = %s
+                AND uo.role = ANY(%s)
+            )""",
+        (user_id, organization_id, roles_allowed),
+    )
 
 
 class WorkerClient:
-    def __init__(self, parser_client, client_type):
+    def __init__(
+        self,
+        parser_client,
+        client_type,
+        access_cache: AccessCache | None = None,
+        database: Database = db,
+    ):
         self.parser_client = parser_client
         self.client_type = client_type
+        # Shared pool, opened by the API lifespan or the worker startup
+        self.db = database
+        # Disabled unless provided
+        self.access_cache = access_cache or AccessCache(max_size=0, ttl=0)
+
+    def get_known_role(
+        self,
+        organization_id: str,
+        user_id: str,
+        token_roles: dict[str, str] | None = None,
+    ):
+        """
+        Role of the user in the organization from the access token or the cache,
+        MISSING if it has to be read from the database.
+        Organizations joined after the token was issued are not in it.
+        """
+        if token_roles and str(organization_id) in token_roles:
+            return token_roles[str(organization_id)]
+        return self.access_cache.get_role(user_id, organization_id)
 
     async def check_user_access_to_organization(
-        self, organization_id: str, user_id: str, roles_allowed: list
+        self,
+        organization_id: str,
+        user_id: str,
+        roles_allowed: list,
+        conn: AsyncConnection | None = None,
+        token_roles: dict[str, str] | None = None,
     ) -> bool:
-        await db.connect()
-        async with db.connection() as conn:
+        role = self.get_known_role(organization_id, user_id, token_roles)
+        if role is not MISSING:
+            return role in roles_allowed
+        # Read from the primary: a replica lagging behind a removal would cache the old role
+        if self.db.is_replica(conn):
+            conn = None
+        async with self.db.connection(conn, organization_id=organization_id) as conn:
             async with conn.cursor() as cur:
                 try:
                     await cur.execute(
                         """
-                        SELECT COUNT(*) FROM user_org 
-                        WHERE user_id = %s AND org_id = %s AND role = ANY(%s);
+                        SELECT role FROM user_org 
+                        WHERE user_id = %s AND org_id = %s
+                        LIMIT 1;
                         """,
-                        (user_id, organization_id, roles_allowed),
+                        (user_id, organization_id),
                     )
-                    count = (await cur.fetchone())[0]
-                    return count > 0
+                    result = await cur.fetchone()
+                    role = result[0] if result else None
+                    self.access_cache.set_role(user_id, organization_id, role)
+                    return role in roles_allowed
                 except Exception as e:
                     logger.error(
                         f"Error checking user access to organization: {e}. Organization might not exist."
@@ -53,28 +225,89 @@ class WorkerClient:
         project_id: str,
         user_id: str,
         roles_allowed: list,
+        conn: AsyncConnection | None = None,
+        token_roles: dict[str, str] | None = None,
     ) -> bool:
-        await db.connect()
-        async with db.connection() as conn:
+        return await self.check_user_access_to_projects(
+            organization_id=organization_id,
+            project_ids=[project_id],
+            user_id=user_id,
+            roles_allowed=roles_allowed,
+            conn=conn,
+            token_roles=token_roles,
+        )
+
+    async def check_user_access_to_projects(
+        self,
+        organization_id: str,
+        project_ids: list[str] | None,
+        user_id: str,
+        roles_allowed: list,
+        conn: AsyncConnection | None = None,
+        token_roles: dict[str, str] | None = None,
+    ) -> bool:
+        """
+        Whether the user can access all the projects, or the whole organization when
+        `project_ids` is None. Checked in a single query.
+        """
+        role = self.get_known_role(organization_id, user_id, token_roles)
+        if role is not MISSING and role not in roles_allowed:
+            return False
+        if project_ids is not None:
+            try:
+                # The same project can be spelled in different cases
+                project_ids = list(
+                    dict.fromkeys(str(uuid.UUID(str(p))) for p in project_ids)
+                )
+            except ValueError:
+                return False
+        if role is not MISSING and (
+            project_ids is None
+            or all(
+                self.access_cache.project_exists(organization_id, project_id)
+                for project_id in project_ids
+            )
+        ):
+            return True
+        if project_ids is None:
+            # Only probes the organization schema, whose projects are all accessible
+            projects_check = (
+                "to_regclass(format('%%I.%%I', %s::TEXT, %s::TEXT)) IS NOT NULL"
+            )
+            projects_params = (organization_id, TableNames.reserved_project_table_name)
+        else:
+            projects_check = f"""(SELECT COUNT(*)
+                                FROM {TableNames.reserved_project_table_name} p
+                                WHERE p.id = ANY(%s::UUID[])
+                            ) = %s"""
+            projects_params = (project_ids, len(project_ids))
+        # Read from the primary: a replica lagging behind a removal would cache the old role
+        if self.db.is_replica(conn):
+            conn = None
+        async with self.db.tenant_connection(organization_id, conn) as conn:
             async with conn.cursor() as cur:
                 try:
+                    # Role and projects are fetched together, the project query fails if the organization does not exist
                     await cur.execute(
                         f"""
-                        SELECT p.id 
-                            FROM "{organization_id}".project p
-                            WHERE p.id = %s 
-                            AND EXISTS (
-                                SELECT 1 
+                        SELECT 
+                            (SELECT uo.role
                                 FROM user_org uo
                                 WHERE uo.user_id = %s 
-                                AND uo.org_id = %s 
-                                AND uo.role = ANY(%s)
-                            );
+                                AND uo.org_id = %s
+                                LIMIT 1),
+                            {projects_check};
                         """,
-                        (project_id, user_id, organization_id, roles_allowed),
+                        (user_id, organization_id, *projects_params),
                     )
-                    count = await cur.fetchone()
-                    return count is not None
+                    role, projects_exist = await cur.fetchone()
+                    self.access_cache.set_role(user_id, organization_id, role)
+                    if projects_exist and project_ids is not None:
+                        for project_id in project_ids:
+                            self.access_cache.set_project_exists(
+                                organization_id, project_id
+                            )
+                    return projects_exist and role in roles_allowed
                 except Exception as e:
                     logger.error(
                         f"Error checking user access to project: {e}. Organization might not exist."
@@ -82,14 +315,17 @@ class WorkerClient:
                     return False
 
     async def create_project(
-        self, project_info: dict, organization_id: str, user_id: str
+        self,
+        project_info: dict,
+        organization_id: str,
+        user_id: str,
+        conn: AsyncConnection | None = None,
     ) -> str:
-        await db.connect()
-        async with db.connection() as conn:
+        async with self.db.tenant_connection(organization_id, conn) as conn:
             async with conn.cursor() as cur:
                 await cur.execute(
                     f"""
-                    INSERT INTO "{organization_id}".{TableNames.reserved_project_table_name} (name, description, created_by_user_id)
+                    INSERT INTO {TableNames.reserved_project_table_name} (name, description, created_by_user_id)
                     VALUES (%s, %s, %s)
                     RETURNING id;
                     """,
@@ -104,17 +340,22 @@ class WorkerClient:
                     raise HTTPException(
                         status_code=500, detail="Failed to insert project"
                     )
+                self.db.mark_write(organization_id)
                 return str(project_result[0])
 
     async def insert_into_table(
-        self, organization_id: str, project_id: str, user_id: str, insert_object: dict
+        self,
+        organization_id: str,
+        project_id: str,
+        user_id: str,
+        insert_object: dict,
+        conn: AsyncConnection | None = None,
     ) -> str:
-        await db.connect()
-        async with db.connection() as conn:
+        async with self.db.tenant_connection(organization_id, conn) as conn:
             async with conn.cursor() as cur:
                 await cur.execute(
                     f"""
-                    INSERT INTO "{organization_id}".{TableNames.reserved_document_table_name} (project_id, document_uploaded_name, metadata, document_bytes, status, parsed_document, summary, uploaded_by_user_id)
+                    INSERT INTO {TableNames.reserved_document_table_name} (project_id, document_uploaded_name, metadata, document_bytes, status, parsed_document, summary, uploaded_by_user_id)
                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                     RETURNING id;
                     """,
@@ -134,6 +375,7 @@ class WorkerClient:
                     raise HTTPException(
                         status_code=500, detail="Failed to insert document"
                     )
+                self.db.mark_write(organization_id)
                 return str(document_result[0])
 
     async def get_organizations_ids(self):
@@ -142,8 +384,7 @@ class WorkerClient:
         database. Assumes each organization has its own schema.
         Returns a list of organization IDs (schema names).
         """
-        await db.connect()
-        async with db.connection() as conn:
+        async with self.db.connection() as conn:
             async with conn.cursor() as cur:
                 await cur.execute("""
                         SELECT id FROM organizations;
@@ -159,13 +400,13 @@ class WorkerClient:
         Returns a list of documents with their schema and table names.
         """
         new_documents = []
-        await db.connect()
-        async with db.connection() as conn:
+        async with self.db.connection() as conn:
             for schemaname in organizations_ids:
+                await set_tenant(conn, schemaname)
                 async with conn.cursor() as cur:
                     await cur.execute(
                         f"""
-                        SELECT * FROM "{schemaname}".{TableNames.reserved_document_table_name} 
+                        SELECT * FROM {TableNames.reserved_document_table_name} 
                         WHERE (status = %s OR status = %s)
                         AND deleted_at IS NULL
                         """,
@@ -229,8 +470,7 @@ class WorkerClient:
         Upload the parsed documents to the database.
         This assumes that the parsed documents are in a format that can be directly inserted into the database.
         """
-        await db.connect()
-        async with db.connection() as conn:
+        async with self.db.connection() as conn:
             async with conn.transaction():
                 async with conn.cursor() as cur:
                     for parsed_document, organization_id in zip(
@@ -242,22 +482,37 @@ class WorkerClient:
                                     "Empty list passed as parsed_document. Skipping document."
                                 )
                                 continue
-                            if isinstance(parsed_document, list):
-                                parsed_document = parsed_document[0]
+                            # The parser returns one document per page
+                            pages = (
+                                parsed_document
+                                if isinstance(parsed_document, list)
+                                else [parsed_document]
+                            )
                             metadata = (
-                                getattr(parsed_document, "metadata", {})
-                                if hasattr(parsed_document, "metadata")
-                                else parsed_document.get("metadata", {})
+                                getattr(pages[0], "metadata", {})
+                                if hasattr(pages[0], "metadata")
+                                else pages[0].get("metadata", {})
                             )
+                            pages_text = [
+                                getattr(page, "text", "")
+                                if hasattr(page, "text")
+                                else page.get("text", "")
+                                for page in pages
+                            ]
+                            parsed_document = {
+                                "text": "\n---\n".join(pages_text),
+                                "metadata": metadata,
+                            }
                             doc_id = metadata.get("id", None)
                             if not doc_id or doc_id == "":
                                 logger.error(
                                     "Document ID not found in parsed_document metadata. Skipping document."
                                 )
                                 continue
+                            await set_tenant(conn, organization_id)
                             await cur.execute(
                                 f"""
-                                UPDATE "{organization_id}".{TableNames.reserved_document_table_name}
+                                UPDATE {TableNames.reserved_document_table_name}
                                 SET status = %s, parsed_document = %s
                                 WHERE id = %s
                                 RETURNING project_id;
@@ -276,14 +531,12 @@ class WorkerClient:
                                 continue
                             await cur.execute(
                                 f"""
-                                INSERT INTO "{organization_id}".{TableNames.reserved_pgai_table_name} 
+                                INSERT INTO {TableNames.reserved_pgai_table_name} 
                                 (text, title, metadata, project_id)
                                 VALUES (%s, %s, %s, %s);
                                 """,
                                 (
-                                    getattr(parsed_document, "text", "")
-                                    if hasattr(parsed_document, "text")
-                                    else parsed_document.get("text", ""),
+                                    parsed_document["text"],
                                     metadata.get("title", ""),
                                     json.dumps(metadata),
                                     project_id[0]
@@ -291,6 +544,26 @@ class WorkerClient:
                                     else None,
                                 ),
                             )
+                            await cur.execute(
+                                f"""
+                                DELETE FROM {TableNames.reserved_document_page_table_name}
+                                WHERE document_id = %s;
+                                """,
+                                (doc_id,),
+                            )
+                            await cur.executemany(
+                                f"""
+                                INSERT INTO {TableNames.reserved_document_page_table_name}
+                                (document_id, page_number, text)
+                                VALUES (%s, %s, %s);
+                                """,
+                                [
+                                    (doc_id, page_number, page_text)
+                                    for page_number, page_text in enumerate(
+                                        pages_text, start=1
+                                    )
+                                ],
+                            )
                         except Exception as e:
                             logger.error(f"Error uploading parsed document: {e}")
                             raise
@@ -299,16 +572,19 @@ class WorkerClient:
         )
 
     async def soft_delete_document(
-        self, organization_id: str, user_id: str, document_id: str
+        self,
+        organization_id: str,
+        user_id: str,
+        document_id: str,
+        conn: AsyncConnection | None = None,
     ) -> bool:
         try:
-            await db.connect()
-            async with db.connection() as conn:
+            async with self.db.tenant_connection(organization_id, conn) as conn:
                 async with conn.transaction():
                     async with conn.cursor() as cur:
                         await cur.execute(
                             f"""
-                                UPDATE "{organization_id}".{TableNames.reserved_document_table_name}
+                                UPDATE {TableNames.reserved_document_table_name}
                                 SET deleted_at = NOW(), deleted_by_user_id = %s
                                 WHERE id = %s
                                 AND deleted_at IS NULL
@@ -327,50 +603,54 @@ class WorkerClient:
                             )
                         await cur.execute(
                             f"""
-                                UPDATE "{organization_id}".{TableNames.reserved_pgai_table_name}
+                                UPDATE {TableNames.reserved_pgai_table_name}
                                 SET deleted_at = NOW()
                                 WHERE (metadata->>'id') = %s
                                 AND deleted_at IS NULL
                                 """,
                             (document_id,),
                         )
+                        self.db.mark_write(organization_id)
                         return True  # might still not be in pgai table, so always return True
 
         except Exception as e:
             logger.error(f"Error deleting document: {e}")
             raise
 
-    async def get_all_projects(self, organization_id: str):
-        await db.connect()
-        async with db.connection() as conn:
+    async def get_all_projects(
+        self, organization_id: str, conn: AsyncConnection | None = None
+    ):
+        async with self.db.tenant_connection(
+            organization_id, conn, read_only=True
+        ) as conn:
             async with conn.cursor() as cur:
                 await cur.execute(
                     f"""
-                        SELECT id FROM "{organization_id}".{TableNames.reserved_project_table_name};
+                        SELECT id FROM {TableNames.reserved_project_table_name};
                         """,
                 )
                 projects = await cur.fetchall()
                 return [str(project[0]) for project in projects]
 
     async def get_all_projects_details(
-        self, organization_id: str
+        self, organization_id: str, conn: AsyncConnection | None = None
     ) -> PaginationResponse:
-        await db.connect()
-        async with db.connection() as conn:
+        async with self.db.tenant_connection(
+            organization_id, conn, read_only=True
+        ) as conn:
             async with conn.cursor() as cur:
                 await cur.execute(
                     f"""
                         SELECT p.id::text as project_id, 
                         p.name as project_name, 
-                        COUNT(d.id) as number_of_documents,
+                        COALESCE(SUM(s.document_count), 0)::bigint as number_of_documents,
                         p.created_at, 
                         p.updated_at, 
                         p.description, 
                         p.created_by_user_id::text
-                        FROM "{organization_id}".{TableNames.reserved_project_table_name} p 
-                        LEFT JOIN "{organization_id}".{TableNames.reserved_document_table_name} d
-                        ON p.id = d.project_id
-                        WHERE d.deleted_at IS NULL
+                        FROM {TableNames.reserved_project_table_name} p 
+                        LEFT JOIN {TableNames.reserved_document_stats_table_name} s
+                        ON p.id = s.project_id
                         GROUP BY p.id, p.name, p.description, p.created_by_user_id, p.created_at, p.updated_at
                         ORDER BY p.name;
                         """,
@@ -384,53 +664,106 @@ class WorkerClient:
                 return PaginationResponse(items=projects_info)
 
     async def get_recent_documents_info(
-        self, organization_id: str, projects: list, skip: int, limit: int
+        self,
+        organization_id: str,
+        projects: list,
+        skip: int,
+        limit: int,
+        fields: list[str] | None = None,
+        cursor: str | None = None,
+        count: CountMode = "exact",
+        conn: AsyncConnection | None = None,
     ) -> PaginationResponse:
-        await db.connect()
-        async with db.connection() as conn:
+        selected_fields, select_list = select_fields(
+            fields, DOCUMENT_INFO_COLUMNS, required=["document_id"]
+        )
+        project_join = (
+            f"""JOIN {TableNames.reserved_project_table_name} p
+                    ON d.project_id = p.id"""
+            if "project_name" in selected_fields
+            else ""
+        )
+        # Documents are ordered by (created_at, id) descending, cursors continue from a boundary key
+        if cursor:
+            key, direction = decode_cursor(cursor, DOCUMENT_CURSOR_KEY)
+            if direction == "next":
+                keyset_condition = (
+                    "AND (d.created_at, d.id) < (%s::timestamptz, %s::uuid)"
+                )
+                order = "DESC"
+            else:
+                keyset_condition = (
+                    "AND (d.created_at, d.id) > (%s::timestamptz, %s::uuid)"
+                )
+                order = "ASC"
+            params = (projects, *key, limit + 1)
+            offset = ""
+        else:
+            direction = "next"
+            keyset_condition = ""
+            order = "DESC"
+            params = (projects, limit + 1, skip)
+            offset = "OFFSET %s"
+        async with self.db.tenant_connection(
+            organization_id, conn, read_only=True
+        ) as conn:
             async with conn.cursor() as cur:
-                await cur.execute(
+                total_count = await count_rows(
+                    cur,
                     f"""
-                    SELECT COUNT(*) FROM "{organization_id}".{TableNames.reserved_document_table_name} as d
+                    FROM {TableNames.reserved_document_table_name} as d
                     WHERE d.project_id = ANY(%s)
                     AND d.deleted_at IS NULL
-                """,
+                    """,
                     (projects,),
+                    count,
                 )
-                total_count = (await cur.fetchone())[0]
+                # One extra row is fetched to know whether there is a page after this one
                 await cur.execute(
                     f"""
-                    SELECT d.id as document_id,
-                    d.document_uploaded_name, 
-                    d.metadata, 
-                    d.status, 
-                    (SELECT username FROM users u WHERE u.id = d.uploaded_by_user_id) as uploaded_by_user_name, 
-                    d.created_at, 
-                    d.project_id, 
-                    p.name as project_name
-                    FROM "{organization_id}".{TableNames.reserved_document_table_name} d
-                    JOIN "{organization_id}".{TableNames.reserved_project_table_name} p
-                    ON d.project_id = p.id
+                    SELECT {select_list},
+                    d.created_at as cursor_created_at,
+                    d.id as cursor_id
+                    FROM {TableNames.reserved_document_table_name} d
+                    {project_join}
                     WHERE d.project_id = ANY(%s)
                     AND d.deleted_at IS NULL
-                    ORDER BY d.created_at DESC
-                    LIMIT %s OFFSET %s
+                    {keyset_condition}
+                    ORDER BY d.created_at {order}, d.id {order}
+                    LIMIT %s {offset}
                 """,
-                    (projects, limit, skip),
+                    params,
                 )
                 documents = await cur.fetchall()
                 column_names = [desc[0] for desc in cur.description]
-                documents_info = [
-                    DocumentInfo(
-                        **dict(zip(column_names, doc), organization_id=organization_id)
-                    )
+                has_more = len(documents) > limit
+                documents = [dict(zip(column_names, doc)) for doc in documents[:limit]]
+                if direction == "prev":
+                    documents.reverse()
+                cursor_keys = [
+                    [doc.pop("cursor_created_at"), doc.pop("cursor_id")]
                     for doc in documents
                 ]
+                extra = (
+                    {"organization_id": organization_id}
+                    if "organization_id" in selected_fields
+                    else {}
+                )
+                documents_info = [DocumentInfo(**doc, **extra) for doc in documents]
 
-                total_pages = (total_count + limit - 1) // limit  # Ceiling division
-                current_page = (skip // limit) + 1
-                has_next = skip + limit < total_count
-                has_previous = skip > 0
+                if cursor:
+                    has_next = has_more if direction == "next" else True
+                    has_previous = has_more if direction == "prev" else True
+                    current_page = None
+                else:
+                    has_next = has_more
+                    has_previous = skip > 0
+                    current_page = (skip // limit) + 1
+                total_pages = (
+                    (total_count + limit - 1) // limit  # Ceiling division
+                    if total_count is not None
+                    else None
+                )
 
                 return PaginationResponse(
                     items=documents_info,
@@ -440,133 +773,389 @@ class WorkerClient:
                     total_pages=total_pages,
                     has_next=has_next,
                     has_previous=has_previous,
+                    next_cursor=encode_cursor(cursor_keys[-1], "next")
+                    if has_next and cursor_keys
+                    else None,
+                    prev_cursor=encode_cursor(cursor_keys[0], "prev")
+                    if has_previous and cursor_keys
+                    else None,
                 )
 
     async def get_document_by_id(
-        self, organization_id: str, document_id: str
+        self,
+        organization_id: str,
+        document_id: str,
+        fields: list[str] | None = None,
+        project_id: str | None = None,
+        user_id: str | None = None,
+        roles_allowed: list | None = None,
+        conn: AsyncConnection | None = None,
+        token_roles: dict[str, str] | None = None,
     ) -> DocumentDetail:
-        await db.connect()
-        async with db.connection() as conn:
+        """
+        Returns the document. If user_id is given, the access check is done by the same query
+        and a 404 is raised when the user does not have one of the allowed roles.
+        """
+        selected_fields, select_list = select_fields(
+            fields, DOCUMENT_DETAIL_COLUMNS, required=["document_id"]
+        )
+        access_condition, access_params = fused_access_condition(
+            organization_id, user_id, roles_allowed, token_roles
+        )
+        project_condition, project_params = (
+            ("AND d.project_id = %s", (project_id,)) if project_id else ("", ())
+        )
+        async with self.db.tenant_connection(
+            organization_id, conn, read_only=True
+        ) as conn:
             async with conn.cursor() as cur:
-                await cur.execute(
-                    f"""
-                        SELECT d.id, d.parsed_document, 
-                        d.document_uploaded_name, 
-                        d.document_bytes, 
-                        d.metadata, 
-                        d.status, 
-                        d.summary, 
-                        d.created_at, 
-                        (SELECT username FROM users u WHERE u.id = d.uploaded_by_user_id) as uploaded_by_user_name 
-                        FROM "{organization_id}".{TableNames.reserved_document_table_name} d
-                        WHERE d.id = %s
-                        AND d.deleted_at IS NULL;
-                        """,
-                    (document_id,),
-                )
-                document = await cur.fetchone()
+                try:
+                    await cur.execute(
+                        f"""
+                            SELECT {select_list}
+                            FROM {TableNames.reserved_document_table_name} d
+                            WHERE d.id = %s
+                            AND d.deleted_at IS NULL
+                            {project_condition}
+                            {access_condition};
+                            """,
+                        (document_id, *project_params, *access_params),
+                    )
+                except (UndefinedTable, InvalidTextRepresentation):
+                    document = None
+                else:
+                    document = await cur.fetchone()
                 if not document:
-                    raise HTTPException(status_code=404, detail="Document not found")
-                (
-                    id,
-                    parsed_document,
-                    document_uploaded_name,
-                    document_bytes,
-                    metadata,
-                    status,
-                    summary,
-                    created_at,
-                    uploaded_by_user_name,
-                ) = document
-                if parsed_document:
+                    raise HTTPException(
+                        status_code=404,
+                        detail="Document does not exist or user does not have access."
+                        if user_id
+                        else "Document not found",
+                    )
+                row = dict(zip([desc[0] for desc in cur.description], document))
+
+                # Only the selected fields are set so that the rest are left out of the response
+                values = {}
+                document_uploaded_name = row.get("document_uploaded_name")
+                if "document_id" in selected_fields:
+                    values["document_id"] = row["id"]
+                if "document_name" in selected_fields:
+                    values["document_name"] = document_uploaded_name
+                if "document_type" in selected_fields:
+                    values["document_type"] = (
+                        document_uploaded_name.split(".")[-1]
+                        if document_uploaded_name and "." in document_uploaded_name
+                        else "pdf"
+                    )
+                if "metadata" in selected_fields:
+                    values["metadata"] = row["metadata"]
+                if "document_status" in selected_fields:
+                    values["document_status"] = row["status"]
+                if "created_at" in selected_fields:
+                    values["created_at"] = row["created_at"]
+                if "updated_at" in selected_fields:
+                    values["updated_at"] = None
+                if "parsed_markdown_text" in selected_fields:
+                    parsed_document = row["parsed_document"]
+                    if parsed_document:
+                        parsed_document = pickle.loads(parsed_document)
+                        parsed_markdown_text = (
+                            getattr(parsed_document, "text", None)
+                            if hasattr(parsed_document, "text")
+                            else parsed_document.get("text", None)
+                        )
+                    else:
+                        parsed_markdown_text = None
+                    values["parsed_markdown_text"] = parsed_markdown_text
+                if "file_bytes" in selected_fields:
+                    document_bytes = row["document_bytes"]
+                    try:
+                        file_bytes_b64 = (
+                            base64.b64encode(document_bytes).decode("utf-8")
+                            if document_bytes
+                            else None
+                        )
+                    except Exception as e:
+                        logger.error(f"Error encoding document bytes to base64: {e}")
+                        file_bytes_b64 = None
+                    values["file_bytes"] = file_bytes_b64  # base64-encoded
+                if "summary" in selected_fields:
+                    values["summary"] = row["summary"] if row["summary"] else ""
+                if "uploaded_by_user_name" in selected_fields:
+                    values["uploaded_by_user_name"] = row["uploaded_by_user_name"]
+
+                return DocumentDetail(**values)
+
+    async def get_document_pages(
+        self,
+        organization_id: str,
+        project_id: str,
+        document_id: str,
+        from_page: int,
+        to_page: int,
+        user_id: str | None = None,
+        roles_allowed: list | None = None,
+        conn: AsyncConnection | None = None,
+        token_roles: dict[str, str] | None = None,
+    ) -> DocumentPagesResponse:
+        """
+        Returns a range of pages of the document. If user_id is given, the access check is done
+        by the same query and a 404 is raised when the user does not have one of the allowed roles.
+        """
+        access_condition, access_params = fused_access_condition(
+            organization_id, user_id, roles_allowed, token_roles
+        )
+        async with self.db.tenant_connection(
+            organization_id, conn, read_only=True
+        ) as conn:
+            async with conn.cursor() as cur:
+                try:
+                    await cur.execute(
+                        f"""
+                            SELECT d.id,
+                            (SELECT COUNT(*) FROM {TableNames.reserved_document_page_table_name} pg
+                                WHERE pg.document_id = d.id) as total_pages
+                            FROM {TableNames.reserved_document_table_name} d
+                            WHERE d.id = %s
+                            AND d.project_id = %s
+                            AND d.deleted_at IS NULL
+                            {access_condition};
+                            """,
+                        (document_id, project_id, *access_params),
+                    )
+                except (UndefinedTable, InvalidTextRepresentation):
+                    document = None
+                else:
+                    document = await cur.fetchone()
+                if not document:
+                    raise HTTPException(
+                        status_code=404,
+                        detail="Document does not exist or user does not have access."
+                        if user_id
+                        else "Document not found",
+                    )
+                total_pages = document[1]
+                if total_pages == 0:
+                    # Documents parsed before pages were stored are served as a single page
+                    await cur.execute(
+                        f"""
+                            SELECT parsed_document
+                            FROM {TableNames.reserved_document_table_name}
+                            WHERE id = %s;
+                            """,
+                        (document_id,),
+                    )
+                    parsed_document = (await cur.fetchone())[0]
+                    if not parsed_document:
+                        return DocumentPagesResponse(
+                            document_id=document_id, total_pages=0, pages=[]
+                        )
                     parsed_document = pickle.loads(parsed_document)
-                    parsed_markdown_text = (
+                    text = (
                         getattr(parsed_document, "text", None)
                         if hasattr(parsed_document, "text")
                         else parsed_document.get("text", None)
                     )
-                else:
-                    parsed_markdown_text = None
-                try:
-                    file_bytes_b64 = (
-                        base64.b64encode(document_bytes).decode("utf-8")
-                        if document_bytes
-                        else None
+                    pages = (
+                        [DocumentPage(page_number=1, text=text or "")]
+                        if from_page <= 1 <= to_page
+                        else []
                     )
-                except Exception as e:
-                    logger.error(f"Error encoding document bytes to base64: {e}")
-                    file_bytes_b64 = None
-
-                return DocumentDetail(
-                    document_name=document_uploaded_name,
-                    document_type=document_uploaded_name.split(".")[-1]
-                    if "." in document_uploaded_name
-                    else "pdf",
-                    metadata=metadata,
-                    document_status=status,
-                    document_id=id,
-                    created_at=created_at,
-                    parsed_markdown_text=parsed_markdown_text,
-                    file_bytes=file_bytes_b64,  # base64-encoded
-                    summary=summary if summary else "",
-                    uploaded_by_user_name=uploaded_by_user_name,
+                    return DocumentPagesResponse(
+                        document_id=document_id, total_pages=1, pages=pages
+                    )
+                await cur.execute(
+                    f"""
+                        SELECT page_number, text
+                        FROM {TableNames.reserved_document_page_table_name}
+                        WHERE document_id = %s
+                        AND page_number BETWEEN %s AND %s
+                        ORDER BY page_number;
+                        """,
+                    (document_id, from_page, to_page),
+                )
+                pages = [
+                    DocumentPage(page_number=page_number, text=text)
+                    for page_number, text in await cur.fetchall()
+                ]
+                return DocumentPagesResponse(
+                    document_id=document_id, total_pages=total_pages, pages=pages
                 )
 
     async def get_projects_info(
-        self, organization_id: str, projects: list
+        self,
+        organization_id: str,
+        skip: int,
+        limit: int,
+        project_id: str | None = None,
+        fields: list[str] | None = None,
+        cursor: str | None = None,
+        count: CountMode = "exact",
+        conn: AsyncConnection | None = None,
     ) -> PaginationResponse:
-        await db.connect()
-        async with db.connection() as conn:
+        """
+        Returns one page of projects ordered by name, their document counts and the total in a single query.
+        """
+        selected_fields, select_list = select_fields(
+            fields, PROJECT_INFO_COLUMNS, required=["project_id"]
+        )
+        # Documents are only counted for the projects of the page, and only when requested
+        document_count_join = (
+            f"""LEFT JOIN LATERAL (
+                        SELECT COALESCE(SUM(s.document_count), 0)::bigint as number_of_documents
+                        FROM {TableNames.reserved_document_stats_table_name} s
+                        WHERE s.project_id = p.id
+                    ) dc ON true"""
+            if "number_of_documents" in selected_fields
+            else ""
+        )
+        if project_id:
+            project_condition = "AND p.id = %s"
+            project_params = (project_id,)
+        else:
+            project_condition = ""
+            project_params = ()
+        if count == "exact":
+            total_query = f"""SELECT COUNT(*) as total_count
+                FROM {TableNames.reserved_project_table_name} p
+                WHERE true {project_condition}"""
+            total_params = project_params
+        elif count == "estimated" and not project_id:
+            # reltuples is -1 until the table has been analyzed, count exactly until then
+            total_query = f"""SELECT CASE WHEN reltuples < 0
+                    THEN (SELECT COUNT(*) FROM {TableNames.reserved_project_table_name})
+                    ELSE reltuples::bigint END as total_count
+                FROM pg_class
+                WHERE oid = '{TableNames.reserved_project_table_name}'::regclass"""
+            total_params = ()
+        elif count == "estimated":
+            total_query = "SELECT 1::bigint as total_count"
+            total_params = ()
+        else:
+            total_query = "SELECT NULL::bigint as total_count"
+            total_params = ()
+        # Projects are ordered by (name, id), cursors continue from a boundary key
+        if cursor:
+            key, direction = decode_cursor(cursor, PROJECT_CURSOR_KEY)
+            if direction == "next":
+                keyset_condition = "AND (COALESCE(p.name, ''), p.id) > (%s, %s::uuid)"
+                order = "ASC"
+            else:
+                keyset_condition = "AND (COALESCE(p.name, ''), p.id) < (%s, %s::uuid)"
+                order = "DESC"
+            page_params = (*project_params, *key, limit + 1)
+            offset = ""
+        else:
+            direction = "next"
+            keyset_condition = ""
+            order = "ASC"
+            page_params = (*project_params, limit + 1, skip)
+            offset = "OFFSET %s"
+        async with self.db.tenant_connection(
+            organization_id, conn, read_only=True
+        ) as conn:
             async with conn.cursor() as cur:
-                # Single query for all projects
+                # The total is always returned, with NULL page columns if the page is empty
                 await cur.execute(
                     f"""
-                    SELECT p.id, p.name, p.description, COUNT(d.id) as doc_count, p.created_at
-                    FROM "{organization_id}".{TableNames.reserved_project_table_name} p 
-                    LEFT JOIN "{organization_id}".{TableNames.reserved_document_table_name} d
-                    ON p.id = d.project_id
-                    WHERE p.id = ANY(%s)
-                    AND d.deleted_at IS NULL
-                    GROUP BY p.id, p.name, p.description
-                    ORDER BY p.name;
+                    WITH page AS (
+                        SELECT {select_list},
+                        COALESCE(p.name, '') as cursor_name,
+                        p.id as cursor_id
+                        FROM {TableNames.reserved_project_table_name} p
+                        {document_count_join}
+                        WHERE true {project_condition}
+                        {keyset_condition}
+                        ORDER BY COALESCE(p.name, '') {order}, p.id {order}
+                        LIMIT %s {offset}
+                    )
+                    SELECT total.total_count, page.*
+                    FROM ({total_query}) total
+                    LEFT JOIN page ON true
+                    ORDER BY page.cursor_name {order}, page.cursor_id {order};
                     """,
-                    (projects,),
+                    (*page_params, *total_params),
                 )
                 results = await cur.fetchall()
+                column_names = [desc[0] for desc in cur.description]
 
-                projects_info_list = [
-                    {
-                        "project_id": str(row[0]),
-                        "project_name": row[1],
-                        "number_of_documents": row[3],
-                        "description": row[2] or "",
-                        "created_at": row[4],
-                    }
-                    for row in results
-                ]
+        rows = [dict(zip(column_names, row)) for row in results]
+        total_count = rows[0].pop("total_count") if rows else None
+        rows = [row for row in rows if row["cursor_id"] is not None]
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if direction == "prev":
+            rows.reverse()
+        cursor_keys = []
+        projects_info_list = []
+        for row in rows:
+            row.pop("total_count", None)
+            cursor_keys.append([row.pop("cursor_name"), row.pop("cursor_id")])
+            projects_info_list.append(ProjectInfo(**row))
+
+        if cursor:
+            has_next = has_more if direction == "next" else True
+            has_previous = has_more if direction == "prev" else True
+            current_page = None
+        else:
+            has_next = has_more
+            has_previous = skip > 0
+            current_page = (skip // limit) + 1
+        total_pages = (
+            (total_count + limit - 1) // limit if total_count is not None else None
+        )
 
         return PaginationResponse(
             items=projects_info_list,
-            total=len(projects_info_list),
-            page=None,
-            per_page=None,
-            total_pages=1,
-            has_next=False,
-            has_previous=False,
+            total_count=total_count,
+            page=current_page,
+            per_page=limit,
+            total_pages=total_pages,
+            has_next=has_next,
+            has_previous=has_previous,
+            next_cursor=encode_cursor(cursor_keys[-1], "next")
+            if has_next and cursor_keys
+            else None,
+            prev_cursor=encode_cursor(cursor_keys[0], "prev")
+            if has_previous and cursor_keys
+            else None,
         )
 
-    async def get_stats(self, organization_id: str, projects: list) -> StatInfo:
-        await db.connect()
-        async with db.connection() as conn:
+    async def get_stats(
+        self,
+        organization_id: str,
+        projects: list | None = None,
+        conn: AsyncConnection | None = None,
+    ) -> StatInfo:
+        """
+        Returns the document counts per status, read from the document counters.
+        Counts all the projects of the organization if `projects` is None.
+        """
+        async with self.db.tenant_connection(
+            organization_id, conn, read_only=True
+        ) as conn:
             async with conn.cursor() as cur:
+                if projects is None:
+                    await cur.execute(
+                        f"""
+                            SELECT COUNT(*) FROM {TableNames.reserved_project_table_name}
+                            """,
+                    )
+                    projects_count = (await cur.fetchone())[0]
+                    project_condition = ""
+                    params = ()
+                else:
+                    projects_count = len(projects)
+                    project_condition = "AND project_id = ANY(%s)"
+                    params = (projects,)
                 await cur.execute(
                     f"""
-                            SELECT status, COUNT(status) FROM "{organization_id}".{TableNames.reserved_document_table_name}
-                            WHERE project_id = ANY(%s)
-                            AND deleted_at IS NULL
+                            SELECT status, SUM(document_count)::bigint FROM {TableNames.reserved_document_stats_table_name}
+                            WHERE document_count > 0
+                            {project_condition}
                             GROUP BY status
                             """,
-                    (projects,),
+                    params,
                 )
 
                 results = await cur.fetchall()
@@ -579,13 +1168,12 @@ class WorkerClient:
 
                 return StatInfo(
                     total_count=total_count,
-                    projects_count=len(projects),
+                    projects_count=projects_count,
                     status_counts=status_counts,
                 )
 
-    async def get_errors(self) -> SystemResponse:
-        await db.connect()
-        async with db.connection() as conn:
+    async def get_errors(self, conn: AsyncConnection | None = None) -> SystemResponse:
+        async with self.db.connection(conn, read_only=True) as conn:
             async with conn.cursor() as cur:
                 await cur.execute(
                     """
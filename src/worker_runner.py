@@ -1,6 +1,7 @@
 from loguru import logger
 from src.configuration import config
 from src.lp_client import LlamaParseClient
+from src.vector_index import ensure_vector_indexes
 from src.worker_client import WorkerClient
 
 
@@ -33,3 +34,7 @@ async def watch_target_tables():
 
 async def parser_runner(ctx):
     await watch_target_tables()
+
+
+async def vector_index_runner(ctx):
+    await ensure_vector_indexes(config)
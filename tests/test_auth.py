@@ -0,0 +1,186 @@
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from src.auth import (
+    decode_jwt_token,
+    generate_access_token,
+    generate_refresh_token,
+    get_current_user,
+)
+from src.configuration import config
+from src.endpoints.user import logout, refresh
+from src.models.user import RefreshTokenRequest
+
+USER_ID = str(uuid.uuid4())
+ORGANIZATION_ID = str(uuid.uuid4())
+
+
+class FakeCursor:
+    def __init__(self, database):
+        self.database = database
+        self.row = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        self.row = None
+        if "INSERT INTO revoked_tokens" in query:
+            jti = params[0]
+            if jti not in self.database.revoked:
+                self.database.revoked.add(jti)
+                self.row = (jti,)
+        elif "FROM users" in query and params[0] in self.database.roles:
+            self.row = (params[0], self.database.roles[params[0]])
+
+    async def fetchone(self):
+        return self.row
+
+
+class FakeConnection:
+    def __init__(self, database):
+        self.database = database
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    def cursor(self):
+        return FakeCursor(self.database)
+
+
+class FakePool:
+    """Revoked token ids and the roles of the users in their organizations"""
+
+    def __init__(self, roles: dict[str, dict[str, str]]):
+        self.revoked: set[str] = set()
+        self.roles = roles
+
+    @asynccontextmanager
+    async def connection(self):
+        yield FakeConnection(self)
+
+
+@pytest.fixture
+def role_claims(monkeypatch):
+    monkeypatch.setattr(config, "JWT_ROLE_CLAIMS", True)
+
+
+@pytest.fixture(params=["America/Los_Angeles", "Asia/Tokyo"])
+def local_timezone(request, monkeypatch):
+    """Runs the test away from UTC"""
+    monkeypatch.setenv("TZ", request.param)
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def current_user(token: str) -> dict:
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    return asyncio.run(get_current_user(credentials))
+
+
+def test_access_token_expiry_ignores_local_timezone(local_timezone):
+    token = generate_access_token(USER_ID, {ORGANIZATION_ID: "admin"}, expires_in=300)
+    payload = decode_jwt_token(token)
+    assert payload["exp"] == pytest.approx(time.time() + 300, abs=5)
+
+
+def test_refresh_token_expiry_ignores_local_timezone(local_timezone):
+    payload = decode_jwt_token(generate_refresh_token(USER_ID, expires_in=3600))
+    assert payload["exp"] == pytest.approx(time.time() + 3600, abs=5)
+
+
+def test_expired_token_is_rejected():
+    token = generate_access_token(USER_ID, {}, expires_in=-10)
+    with pytest.raises(HTTPException) as error:
+        decode_jwt_token(token)
+    assert error.value.detail == "Token has expired"
+
+
+def test_current_user_accepts_access_tokens():
+    payload = current_user(generate_access_token(USER_ID, {ORGANIZATION_ID: "admin"}))
+    assert payload["user_id"] == USER_ID
+    assert payload["orgs"] == {ORGANIZATION_ID: "admin"}
+
+
+def test_current_user_rejects_refresh_tokens():
+    with pytest.raises(HTTPException) as error:
+        current_user(generate_refresh_token(USER_ID))
+    assert error.value.status_code == 401
+
+
+def test_refresh_rotates_the_token(role_claims):
+    pool = FakePool({USER_ID: {ORGANIZATION_ID: "member"}})
+    refresh_token = generate_refresh_token(USER_ID)
+    response = asyncio.run(
+        refresh(RefreshTokenRequest(refresh_token=refresh_token), pool)
+    )
+
+    old_jti = decode_jwt_token(refresh_token)["jti"]
+    new_refresh = decode_jwt_token(response.refresh_token)
+    assert new_refresh["type"] == "refresh"
+    assert new_refresh["jti"] != old_jti
+    assert pool.revoked == {old_jti}
+    # The access token carries the roles read from the database
+    access = decode_jwt_token(response.token)
+    assert access["type"] == "access"
+    assert access["orgs"] == {ORGANIZATION_ID: "member"}
+
+
+def test_refresh_token_is_single_use(role_claims):
+    pool = FakePool({USER_ID: {}})
+    body = RefreshTokenRequest(refresh_token=generate_refresh_token(USER_ID))
+    asyncio.run(refresh(body, pool))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(refresh(body, pool))
+    assert error.value.status_code == 401
+    assert error.value.detail == "Token has been revoked"
+
+
+def test_logout_revokes_the_refresh_token(role_claims):
+    pool = FakePool({USER_ID: {}})
+    body = RefreshTokenRequest(refresh_token=generate_refresh_token(USER_ID))
+    asyncio.run(logout(body, pool))
+    assert pool.revoked == {decode_jwt_token(body.refresh_token)["jti"]}
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(refresh(body, pool))
+    assert error.value.detail == "Token has been revoked"
+
+
+def test_refresh_rejects_access_tokens(role_claims):
+    pool = FakePool({USER_ID: {}})
+    body = RefreshTokenRequest(refresh_token=generate_access_token(USER_ID, {}))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(refresh(body, pool))
+    assert error.value.status_code == 401
+    assert pool.revoked == set()
+
+
+def test_refresh_rejects_tampered_tokens(role_claims):
+    pool = FakePool({USER_ID: {}})
+    token = jwt.encode(
+        {"user_id": USER_ID, "jti": "x", "type": "refresh", "exp": time.time() + 60},
+        "not the secret key of this deployment",
+        algorithm="HS256",
+    )
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(refresh(RefreshTokenRequest(refresh_token=token), pool))
+    assert error.value.detail == "Invalid token"
+
+
+def test_refresh_of_a_deleted_user_is_rejected(role_claims):
+    pool = FakePool({})
+    body = RefreshTokenRequest(refresh_token=generate_refresh_token(USER_ID))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(refresh(body, pool))
+    assert error.value.status_code == 401
@@ -0,0 +1,102 @@
+import asyncio
+from unittest.mock import AsyncMock
+import numpy as np
+from src.embedding_cache import REDIS_KEY_PREFIX, EmbeddingCache
+
+# 4 single precision floats
+EMBEDDING_BYTES = 16
+
+
+def embedding(value: float, dimensions: int = 4) -> np.ndarray:
+    return np.full(dimensions, value, dtype=np.float32)
+
+
+def test_evicts_least_recently_used():
+    cache = EmbeddingCache(max_bytes=3 * EMBEDDING_BYTES)
+
+    async def run():
+        await cache.set("a", embedding(1))
+        await cache.set("b", embedding(2))
+        await cache.set("c", embedding(3))
+        assert await cache.get("a") is not None
+        await cache.set("d", embedding(4))
+        assert await cache.get("b") is None
+        for key in ("a", "c", "d"):
+            assert await cache.get(key) is not None
+
+    asyncio.run(run())
+    assert len(cache) == 3
+    assert cache.size == 3 * EMBEDDING_BYTES
+
+
+def test_overwrite_replaces_size():
+    cache = EmbeddingCache(max_bytes=10 * EMBEDDING_BYTES)
+
+    async def run():
+        await cache.set("a", embedding(1))
+        await cache.set("a", embedding(2, dimensions=8))
+        return await cache.get("a")
+
+    assert asyncio.run(run())[0] == 2
+    assert len(cache) == 1
+    assert cache.size == 2 * EMBEDDING_BYTES
+
+
+def test_stores_single_precision():
+    cache = EmbeddingCache(max_bytes=EMBEDDING_BYTES)
+    asyncio.run(cache.set("a", np.ones(4, dtype=np.float64)))
+    assert cache.size == EMBEDDING_BYTES
+    assert asyncio.run(cache.get("a")).dtype == np.float32
+
+
+def test_disabled_without_budget():
+    cache = EmbeddingCache(max_bytes=0)
+    asyncio.run(cache.set("a", embedding(1)))
+    assert asyncio.run(cache.get("a")) is None
+    assert len(cache) == 0
+    assert cache.size == 0
+
+
+def test_embedding_larger_than_budget_keeps_the_others():
+    cache = EmbeddingCache(max_bytes=2 * EMBEDDING_BYTES)
+
+    async def run():
+        await cache.set("a", embedding(1))
+        await cache.set("big", embedding(2, dimensions=12))
+        assert await cache.get("big") is None
+        assert await cache.get("a") is not None
+
+    asyncio.run(run())
+    assert cache.size == EMBEDDING_BYTES
+
+
+def test_redis_hit_is_kept_locally():
+    redis = AsyncMock()
+    redis.get.return_value = embedding(5).tobytes()
+    cache = EmbeddingCache(max_bytes=EMBEDDING_BYTES, redis=redis)
+    assert asyncio.run(cache.get("a"))[0] == 5
+    redis.get.assert_awaited_once_with(REDIS_KEY_PREFIX + "a")
+    assert asyncio.run(cache.get("a"))[0] == 5
+    assert redis.get.await_count == 1
+
+
+def test_redis_failure_falls_back_to_local_cache():
+    redis = AsyncMock()
+    redis.get.side_effect = ConnectionError("Redis is down")
+    redis.set.side_effect = ConnectionError("Redis is down")
+    cache = EmbeddingCache(max_bytes=EMBEDDING_BYTES, redis=redis, redis_ttl=60)
+
+    async def run():
+        assert await cache.get("missing") is None
+        await cache.set("a", embedding(1))
+        return await cache.get("a")
+
+    assert asyncio.run(run())[0] == 1
+    redis.set.assert_awaited_once()
+
+
+def test_key_ignores_case_and_whitespace():
+    key = EmbeddingCache.key("model", 4, "Hello  World")
+    assert key == EmbeddingCache.key("model", 4, " hello world ")
+    assert key != EmbeddingCache.key("model", 8, "hello world")
+    assert key != EmbeddingCache.key("other", 4, "hello world")
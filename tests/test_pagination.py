@@ -0,0 +1,60 @@
+import base64
+import json
+import uuid
+from datetime import datetime, timezone
+import pytest
+from fastapi import HTTPException
+from src.models.pagination import (
+    DOCUMENT_CURSOR_KEY,
+    PROJECT_CURSOR_KEY,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def test_document_cursor_round_trip():
+    created_at = datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc)
+    document_id = uuid.uuid4()
+    key, direction = decode_cursor(
+        encode_cursor([created_at, document_id], "prev"), DOCUMENT_CURSOR_KEY
+    )
+    assert key == [created_at, document_id]
+    assert direction == "prev"
+
+
+def test_project_cursor_round_trip():
+    project_id = uuid.uuid4()
+    key, direction = decode_cursor(
+        encode_cursor(["name", project_id], "next"), PROJECT_CURSOR_KEY
+    )
+    assert key == ["name", project_id]
+    assert direction == "next"
+
+
+@pytest.mark.parametrize(
+    "cursor, key_parsers",
+    [
+        ("not a cursor", PROJECT_CURSOR_KEY),
+        (raw_cursor({"k": [1], "d": "next"}), PROJECT_CURSOR_KEY),
+        (
+            raw_cursor({"k": ["name", str(uuid.uuid4()), 1], "d": "next"}),
+            PROJECT_CURSOR_KEY,
+        ),
+        (raw_cursor({"k": ["name", "not a uuid"], "d": "next"}), PROJECT_CURSOR_KEY),
+        (raw_cursor({"k": [1, str(uuid.uuid4())], "d": "next"}), PROJECT_CURSOR_KEY),
+        (raw_cursor({"k": ["name", str(uuid.uuid4())], "d": "up"}), PROJECT_CURSOR_KEY),
+        (
+            raw_cursor({"k": ["yesterday", str(uuid.uuid4())], "d": "next"}),
+            DOCUMENT_CURSOR_KEY,
+        ),
+        (raw_cursor({"k": "name", "d": "next"}), PROJECT_CURSOR_KEY),
+    ],
+)
+def test_invalid_cursors_are_rejected(cursor, key_parsers):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, key_parsers)
+    assert error.value.status_code == 400
@@ -0,0 +1,138 @@
+import asyncio
+import pytest
+from src.models.document import DocumentSearchResult
+from src.pgai_client import (
+    PGAIClient,
+    SearchStrategy,
+    clamp_ef_search,
+    reciprocal_rank_fusion,
+)
+from src.vector_index import MAX_EF_SEARCH
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        self.conn.queries.append((query, params))
+
+    async def fetchall(self):
+        return []
+
+
+class FakeConnection:
+    """Records the queries instead of running them"""
+
+    def __init__(self):
+        self.queries = []
+
+    async def execute(self, query, params=None):
+        self.queries.append((query, params))
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+
+def run_vector_search(limit: int, ef_search: int, strategy: SearchStrategy):
+    conn = FakeConnection()
+    client = PGAIClient()
+    asyncio.run(client.vector_search(conn, [0.0], None, limit, ef_search, strategy))
+    return conn.queries
+
+
+def ef_search_settings(queries) -> list[str]:
+    return [params[0] for query, params in queries if "hnsw.ef_search" in query]
+
+
+def test_clamp_ef_search():
+    assert clamp_ef_search(40) == 40
+    assert clamp_ef_search(0) == 1
+    assert clamp_ef_search(MAX_EF_SEARCH) == MAX_EF_SEARCH
+    assert clamp_ef_search(5000) == MAX_EF_SEARCH
+
+
+def test_iterative_search_clamps_ef_search():
+    queries = run_vector_search(5000, 5000, SearchStrategy.ITERATIVE)
+    assert ef_search_settings(queries) == [str(MAX_EF_SEARCH)]
+
+
+def test_index_search_beyond_max_ef_search_scans_exactly():
+    queries = run_vector_search(5000, 5000, SearchStrategy.INDEX)
+    assert ef_search_settings(queries) == []
+    assert "+ 0" in queries[-1][0]
+
+
+def test_index_search_sets_ef_search():
+    queries = run_vector_search(10, 40, SearchStrategy.INDEX)
+    assert ef_search_settings(queries) == ["40"]
+
+
+def result(id: int, chunk: str = "chunk", distance: float = 0.5):
+    return DocumentSearchResult(
+        id=id,
+        title=f"title {id}",
+        metadata={},
+        text=f"text {id}",
+        project_id="project",
+        chunk=chunk,
+        distance=distance,
+    )
+
+
+def ids(results) -> list[tuple[int, str]]:
+    return [(r.id, r.chunk) for r in results]
+
+
+def test_fusion_favors_chunks_ranked_by_both():
+    vector = [result(1), result(2), result(3)]
+    text = [result(3), result(4), result(2)]
+    fused = reciprocal_rank_fusion([(vector, 1.0), (text, 1.0)], k=60, limit=10)
+    assert ids(fused) == [(3, "chunk"), (2, "chunk"), (1, "chunk"), (4, "chunk")]
+    assert fused[0].score == pytest.approx(1 / 63 + 1 / 61)
+    assert fused[-1].score == pytest.approx(1 / 62)
+    assert [r.score for r in fused] == sorted((r.score for r in fused), reverse=True)
+
+
+def test_fusion_weights():
+    vector = [result(1), result(2)]
+    text = [result(2), result(1)]
+    fused = reciprocal_rank_fusion([(vector, 1.0), (text, 3.0)], k=60, limit=10)
+    assert ids(fused) == [(2, "chunk"), (1, "chunk")]
+    assert fused[0].score == pytest.approx(1 / 62 + 3 / 61)
+
+
+def test_fusion_zero_weight_ignores_ranking():
+    vector = [result(1), result(2)]
+    text = [result(2), result(3)]
+    fused = reciprocal_rank_fusion([(vector, 1.0), (text, 0.0)], k=60, limit=10)
+    # Chunks only found by the ignored ranking are kept, last
+    assert ids(fused) == [(1, "chunk"), (2, "chunk"), (3, "chunk")]
+    assert fused[2].score == 0.0
+
+
+def test_fusion_keys_on_id_and_chunk():
+    vector = [result(1, "first"), result(1, "second")]
+    text = [result(1, "second", distance=0.9)]
+    fused = reciprocal_rank_fusion([(vector, 1.0), (text, 1.0)], k=60, limit=10)
+    assert ids(fused) == [(1, "second"), (1, "first")]
+    # The first ranking's copy of a chunk is kept
+    assert fused[0].distance == 0.5
+
+
+def test_fusion_truncates_to_limit():
+    vector = [result(i) for i in range(10)]
+    fused = reciprocal_rank_fusion([(vector, 1.0)], k=60, limit=3)
+    assert ids(fused) == [(0, "chunk"), (1, "chunk"), (2, "chunk")]
+
+
+def test_fusion_does_not_modify_the_results():
+    vector = [result(1)]
+    reciprocal_rank_fusion([(vector, 1.0)], k=60, limit=10)
+    assert vector[0].score is None
@@ -0,0 +1,115 @@
+import asyncio
+from contextlib import asynccontextmanager
+from src.access_cache import AccessCache
+from src.database import Database
+from src.pool_metrics import PoolMetrics
+from src.worker_client import WorkerClient
+
+ORGANIZATION_ID = "835fe525-8f11-41ec-babf-d946b51e88db"
+PROJECT_ID = "b78561cc-71b2-45fb-ad7b-c3db7db0e81f"
+USER_ID = "c3b1f0a2-5d4e-4f6a-9b8c-7d6e5f4a3b2c"
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        self.conn.queries.append(query)
+
+    async def fetchone(self):
+        # Role of the user, and whether the projects exist
+        return self.conn.role, True
+
+
+class FakeConnection:
+    # Lets psycopg compose the tenant's search_path without a server
+    connection = None
+
+    def __init__(self, role: str | None):
+        self.role = role
+        self.queries = []
+
+    async def execute(self, query, params=None):
+        self.queries.append(query)
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+
+class FakePool:
+    def __init__(self, name: str, role: str | None):
+        self.name = name
+        self.conn = FakeConnection(role)
+
+    @asynccontextmanager
+    async def connection(self):
+        yield self.conn
+
+
+def database_with_lagging_replica() -> Database:
+    """The user was removed from the organization, the replica has not replayed it yet"""
+    database = Database()
+    database.pool = FakePool("primary", None)
+    database.read_pools = [FakePool("replica_0", "admin")]
+    database.metrics = {pool.name: PoolMetrics(pool.name) for pool in database.pools}
+    return database
+
+
+def test_access_checks_on_a_replica_connection_read_the_primary():
+    database = database_with_lagging_replica()
+    access_cache = AccessCache(max_size=100, ttl=30)
+    worker_client = WorkerClient(
+        None, "test", access_cache=access_cache, database=database
+    )
+
+    async def run():
+        async with database.connection(
+            read_only=True, organization_id=ORGANIZATION_ID
+        ) as conn:
+            assert database.is_replica(conn)
+            organization_access = await worker_client.check_user_access_to_organization(
+                ORGANIZATION_ID, USER_ID, ["admin"], conn=conn
+            )
+            access_cache.invalidate_role(USER_ID, ORGANIZATION_ID)
+            project_access = await worker_client.check_user_access_to_project(
+                ORGANIZATION_ID, PROJECT_ID, USER_ID, ["admin"], conn=conn
+            )
+        return organization_access, project_access
+
+    assert asyncio.run(run()) == (False, False)
+    assert database.read_pools[0].conn.queries == []
+    # The stale role of the replica did not make it to the cache
+    assert access_cache.get_role(USER_ID, ORGANIZATION_ID) is None
+
+
+def test_primary_connections_are_reused():
+    database = database_with_lagging_replica()
+    worker_client = WorkerClient(None, "test", database=database)
+
+    async def run():
+        async with database.connection() as conn:
+            assert not database.is_replica(conn)
+            return await worker_client.check_user_access_to_organization(
+                ORGANIZATION_ID, USER_ID, ["admin"], conn=conn
+            )
+
+    assert asyncio.run(run()) is False
+    assert len(database.pool.conn.queries) == 1
+
+
+def test_replica_connections_are_forgotten_once_returned():
+    database = database_with_lagging_replica()
+
+    async def run():
+        async with database.connection(read_only=True) as conn:
+            pass
+        return conn
+
+    assert not database.is_replica(asyncio.run(run()))